@@ -12,29 +12,31 @@
 
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk,Gdk
+from gi.repository import Gtk,Gdk,GLib
 from sugar3.activity import activity
 from sugar3 import profile
 from sugar3.graphics.toolbarbox import ToolbarBox
 from sugar3.activity.widgets import ActivityToolbarButton
 from sugar3.activity.widgets import StopButton
+from sugar3.datastore import datastore
 
 from toolbar_utils import button_factory, label_factory, separator_factory, \
-                          radio_factory
+                          radio_factory, combo_factory
 from utils import json_load, json_dump
 
+import os
 import dbus
 import logging
+from base64 import b64encode, b64decode
 
-try:
-    from sugar3.presence.wrapper import CollabWrapper
-    logging.error('USING SUGAR COLLAB WRAPPER!')
-except ImportError:
-    from collabwrapper import CollabWrapper
+from collabwrapper import CollabWrapper
 
 from gettext import gettext as _
 
-from game import Game
+from game import Game, TEN, SIX
+from codec import CODEC_VERSION, encode_game, decode_game, encode_clicks, \
+    decode_clicks, encode_state, decode_state
+from recorder import Recorder, RECORDING_MIME
 
 import logging
 _logger = logging.getLogger('reflection-activity')
@@ -44,6 +46,15 @@ SERVICE = 'org.sugarlabs.ReflectionActivity'
 IFACE = SERVICE
 PATH = '/org/augarlabs/ReflectionActivity'
 
+# (columns, rows) of the boards offered in the toolbar
+BOARD_SIZES = [(TEN, SIX), (20, 12), (40, 24), (100, 60)]
+
+# Outgoing dot clicks are coalesced and sent together in frames of
+COALESCE_WINDOW = 50  # milliseconds
+
+# Players compare board checksums every (seconds)
+CHECKSUM_INTERVAL = 5
+
 
 class ReflectionActivity(activity.Activity):
     ''' Reflection puzzle game '''
@@ -61,6 +72,11 @@ class ReflectionActivity(activity.Activity):
         else:
             self.colors = ['#A0FFA0', '#FF8080']
 
+        # read_file may be called from show_all, before there is a game
+        self._game = None
+        self._restored = False
+        self._saved_state = None  # read from the Journal data file
+
         self._setup_toolbars()
 
         # Create a canvas
@@ -72,8 +88,20 @@ class ReflectionActivity(activity.Activity):
         self.show_all()
 
         self._game = Game(canvas, parent=self, colors=self.colors)
+        self._game.recorder = Recorder(os.path.join(
+            self.get_activity_root(), 'instance', '%s.rec' % self.get_id()))
         self._setup_collab()
-    
+
+        if 'state' in self.metadata:
+            try:
+                self._restore_state(*decode_state(
+                    b64decode(self.metadata['state'])))
+            except ValueError as e:
+                _logger.error('could not restore the saved state: %s', e)
+        if not self._restored and self._saved_state is not None:
+            self._restore_state(*self._saved_state)
+        if self._restored:
+            return
         if 'dotlist' in self.metadata:
             self._restore()
         else:
@@ -95,11 +123,12 @@ class ReflectionActivity(activity.Activity):
         toolbox.show()
         self.toolbar = toolbox.toolbar
 
-        my_colors = radio_factory(
+        self._my_colors_button = radio_factory(
             'my-colors', self.toolbar, self._my_colors_cb, group=None)
 
-        radio_factory('toolbar-colors', self.toolbar,
-                      self._roygbiv_colors_cb, group=my_colors)
+        self._roygbiv_button = radio_factory(
+            'toolbar-colors', self.toolbar, self._roygbiv_colors_cb,
+            group=self._my_colors_button)
 
         self._new_game_button_h = button_factory(
             'new-game-horizontal', self.toolbar, self._new_game_cb,
@@ -116,6 +145,11 @@ class ReflectionActivity(activity.Activity):
             cb_arg='bilateral',
             tooltip=_('Start a new bilateral-reflection game.'))
 
+        self._board_size_combo = combo_factory(
+            ['%d × %d' % size for size in BOARD_SIZES], self.toolbar,
+            self._board_size_cb, tooltip=_('Size of the board'),
+            default='%d × %d' % BOARD_SIZES[0])
+
         self.status = label_factory(self.toolbar, '')
 
         separator_factory(toolbox.toolbar, False, True)
@@ -124,6 +158,16 @@ class ReflectionActivity(activity.Activity):
             'robot-off', self.toolbar, self._robot_cb,
             tooltip= _('Play with the robot.'))
 
+        button_factory('edit-undo', self.toolbar, self._undo_cb,
+                       tooltip=_('Undo'), accelerator='<Ctrl>z')
+
+        button_factory('edit-redo', self.toolbar, self._redo_cb,
+                       tooltip=_('Redo'), accelerator='<Ctrl><Shift>z')
+
+        button_factory(
+            'document-save', self.toolbar, self._save_recording_cb,
+            tooltip=_('Keep a recording of the game in the Journal'))
+
         separator_factory(toolbox.toolbar, True, False)
 
         stop_button = StopButton(self)
@@ -132,15 +176,21 @@ class ReflectionActivity(activity.Activity):
         stop_button.show()
 
     def _my_colors_cb(self, button=None):
-        if hasattr(self, '_game'):
+        if self._game is not None:
             self._game.roygbiv = False
             self._game.new_game()
 
     def _roygbiv_colors_cb(self, button=None):
-        if hasattr(self, '_game'):
+        if self._game is not None:
             self._game.roygbiv = True
             self._game.new_game()
 
+    def _board_size_cb(self, combo):
+        ''' Start a new game on a board of the selected size. '''
+        if self._game is not None:
+            columns, rows = BOARD_SIZES[combo.get_active()]
+            self._game.new_game(self._game.save_game()[1], columns, rows)
+
     def _new_game_cb(self, button=None, orientation='horizontal'):
         ''' Start a new game. '''
         self._game.new_game(orientation)
@@ -152,6 +202,14 @@ class ReflectionActivity(activity.Activity):
         else:
             self.set_robot_status(False, 'robot-off')
 
+    def _undo_cb(self, button=None):
+        ''' Undo our last move (and the robot's reply). '''
+        self._game.undo()
+
+    def _redo_cb(self, button=None):
+        ''' Redo the move we undid last. '''
+        self._game.redo()
+
     def set_robot_status(self, status, icon):
         ''' Reset robot icon and status '''
         self._game.playing_with_robot = status
@@ -159,13 +217,93 @@ class ReflectionActivity(activity.Activity):
 
     def write_file(self, file_path):
         ''' Write the grid status to the Journal '''
-        [dot_list, orientation] = self._game.save_game()
+        [dot_list, orientation, columns, rows] = self._game.save_game()
+        state = encode_state(dot_list, orientation, columns, rows,
+                             self._game.roygbiv,
+                             self._game.playing_with_robot)
+        with open(file_path, 'wb') as f:
+            f.write(state)
+        self.metadata['state'] = b64encode(state).decode('ascii')
+        # Older versions of the activity only read these
         self.metadata['orientation'] = orientation
-        self.metadata['dotlist'] = ''
-        for dot in dot_list:
-            self.metadata['dotlist'] += str(dot)
-            if dot_list.index(dot) < len(dot_list) - 1:
-                self.metadata['dotlist'] += ' '
+        self.metadata['columns'] = str(columns)
+        self.metadata['rows'] = str(rows)
+        self.metadata['dotlist'] = ' '.join(map(str, dot_list))
+
+    def can_close(self):
+        ''' Close the recording; it is carried on when the activity is
+        resumed '''
+        recorder = self._game.recorder
+        if recorder is not None:
+            self._game.recorder = None
+            recorder.close()
+        return True
+
+    def _save_recording_cb(self, button=None):
+        ''' Keep a copy of the recording of the game in the Journal,
+        replacing the copy kept before '''
+        recorder = self._game.recorder
+        if recorder is None or recorder.records < 2:
+            return  # nothing but the first game
+        recorder.flush()
+        jobject = None
+        if 'recording_id' in self.metadata:
+            try:
+                jobject = datastore.get(self.metadata['recording_id'])
+            except dbus.exceptions.DBusException:
+                _logger.debug('the recording was removed from the Journal')
+        if jobject is None:
+            jobject = datastore.create()
+            jobject.metadata['title'] = _('%s (recording)') % \
+                self.metadata.get('title', _('Reflection'))
+            jobject.metadata['mime_type'] = RECORDING_MIME
+            jobject.metadata['activity'] = self.get_bundle_id()
+        jobject.file_path = recorder.path
+        datastore.write(jobject)
+        self.metadata['recording_id'] = jobject.object_id
+        jobject.destroy()
+
+    def read_file(self, file_path):
+        ''' Restore the game from the Journal data file, unless the
+        metadata held it already.  Before the game is made, the state
+        is kept for __init__ to restore. '''
+        if self._restored:
+            return
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        try:
+            state = decode_state(data)
+        except ValueError as e:
+            _logger.debug('no saved state in %s: %s', file_path, e)
+            return
+        if self._game is None:
+            self._saved_state = state
+        else:
+            self._restore_state(*state)
+
+    def _restore_state(self, dot_list, orientation, columns, rows,
+                       roygbiv=False, robot=False):
+        ''' Set the toolbars to match a saved game, then restore it '''
+        # Without starting a new game from the toolbar callbacks
+        handlers = [(self._my_colors_button, self._my_colors_cb),
+                    (self._roygbiv_button, self._roygbiv_colors_cb),
+                    (self._board_size_combo, self._board_size_cb)]
+        for widget, callback in handlers:
+            widget.handler_block_by_func(callback)
+        if roygbiv:
+            self._roygbiv_button.set_active(True)
+        else:
+            self._my_colors_button.set_active(True)
+        if (columns, rows) in BOARD_SIZES:
+            self._board_size_combo.set_active(
+                BOARD_SIZES.index((columns, rows)))
+        for widget, callback in handlers:
+            widget.handler_unblock_by_func(callback)
+        if robot:
+            self.set_robot_status(True, 'robot-on')
+        self._game.roygbiv = roygbiv
+        self._game.restore_game(dot_list, orientation, columns, rows)
+        self._restored = True
 
     def _restore(self):
         ''' Restore the game state from metadata '''
@@ -174,56 +312,200 @@ class ReflectionActivity(activity.Activity):
         else:
             orientation = 'horizontal'
 
-        dot_list = []
-        dots = self.metadata['dotlist'].split()
-        for dot in dots:
-            dot_list.append(int(dot))
-        self._game.restore_game(dot_list, orientation)
+        columns = int(self.metadata.get('columns', TEN))
+        rows = int(self.metadata.get('rows', SIX))
+
+        dot_list = [int(dot) for dot in self.metadata['dotlist'].split()]
+        self._game.restore_game(dot_list, orientation, columns, rows)
+        self._restored = True
 
     # Collaboration-related methods
 
+    def get_data(self):
+        ''' The game state sent to buddies joining the share '''
+        return dict(game = encode_game(*self._game.save_game()),
+                    clock = self._game.clock())
+
+    def set_data(self, data):
+        ''' Restore the game state from the leader of the share '''
+        if data is not None and 'game' in data:
+            try:
+                game = decode_game(data['game'])
+            except ValueError as e:
+                _logger.error('could not restore the shared game: %s', e)
+                return
+            self._game.restore_game(*game, clock=data.get('clock', 0))
+
     def _setup_collab(self):
         ''' Setup the Collab Wrapper. '''
         self.initiating = None  # sharing (True) or joining (False)
+        self._buddies = set()
+        self._codec_buddies = set()  # buddies who understand the codec
         self._collab = CollabWrapper(self)
         self._collab.connect('message', self.__message_cb)
+        self._collab.connect('joined', self.__joined_cb)
+        self._collab.connect('buddy_joined', self.__buddy_joined_cb)
+        self._collab.connect('buddy_left', self.__buddy_left_cb)
+        self._collab.set_coalesce_window(COALESCE_WINDOW)
 
         owner = self._collab._leader
         self.owner = owner
+        self._game.author = self._collab.props.session
         self._game.set_sharing(True)
         self._collab.setup()
+        GLib.timeout_add_seconds(CHECKSUM_INTERVAL, self.__checksum_cb)
+
+    def __joined_cb(self, collab):
+        self._announce_codec()
+
+    def __buddy_joined_cb(self, collab, buddy):
+        self._buddies.add(_buddy_key(buddy))
+        self._announce_codec()
+
+    def __buddy_left_cb(self, collab, buddy):
+        self._buddies.discard(_buddy_key(buddy))
+        self._codec_buddies.discard(_buddy_key(buddy))
+
+    def _announce_codec(self):
+        ''' Tell the other players which compact codec we understand '''
+        self._collab.post(dict(action = 'v', payload = CODEC_VERSION),
+                          key='v', state=False)
+
+    def _use_codec(self):
+        ''' Use the compact codec only if every player understands it;
+        older players only read JSON payloads. '''
+        return self._buddies <= self._codec_buddies
 
     def __message_cb(self, collab, buddy, message):
+        try:
+            self._receive_message(buddy, message)
+        except ValueError as e:
+            _logger.error('ignoring a bad %r message: %s',
+                          message.get('action'), e)
+
+    def _receive_message(self, buddy, message):
         action = message.get('action')
         payload = message.get('payload')
-        if action == 'n':
+        if action == 'v':
+            '''A player announces its codec'''
+            if payload == CODEC_VERSION and buddy is not None:
+                self._codec_buddies.add(_buddy_key(buddy))
+        elif action == 'N':
+            '''Get a new game grid (compact)'''
+            self._game.restore_game(*decode_game(payload),
+                                    clock=message.get('clock', 0))
+        elif action == 'P':
+            '''Get dot clicks (compact)'''
+            self._game.remote_button_presses(decode_clicks(payload),
+                                             message.get('clocks'),
+                                             message.get('_sender', ''))
+        elif action == 'n':
             '''Get a new game grid'''
-            self._receive_new_game(payload)
+            self._receive_new_game(payload,
+                                   message.get('columns', TEN),
+                                   message.get('rows', SIX),
+                                   message.get('clock', 0))
         elif action == 'p':
             '''Get a dot click'''
-            self._receive_dot_click(payload)
+            self._receive_dot_click(payload, message.get('clocks'),
+                                    message.get('_sender', ''))
+        elif action == 'c':
+            '''Compare a player's board with ours'''
+            self._receive_checksums(payload)
+        elif action == 'r':
+            '''Get rows that differed from a player's board'''
+            self._game.merge_rows(payload)
 
     def send_new_game(self):
         ''' Send a new orientation, grid to all players '''
+        [dot_list, orientation, columns, rows] = self._game.save_game()
+        if self._use_codec():
+            self._collab.post(dict(
+                    action = 'N',
+                    payload = encode_game(dot_list, orientation, columns,
+                                          rows),
+                    clock = self._game.clock()
+                ))
+            return
         self._collab.post(dict(
                 action = 'n',
-                payload = json_dump(self._game.save_game())
+                payload = json_dump([dot_list, orientation]),
+                columns = columns,
+                rows = rows,
+                clock = self._game.clock()
             ))
 
-    def _receive_new_game(self, payload):
+    def _receive_new_game(self, payload, columns=TEN, rows=SIX, clock=0):
         ''' Sharer can start a new game. '''
         [dot_list, orientation] = json_load(payload)
-        self._game.restore_game(dot_list, orientation)
+        self._game.restore_game(dot_list, orientation, columns, rows, clock)
 
-    def send_dot_click(self, dot, color):
+    def send_dot_click(self, dot, color, clock):
         ''' Send a dot click to all the players '''
+        if self._use_codec():
+            self._collab.post(dict(
+                    action = 'P',
+                    payload = encode_clicks([(dot, color)]),
+                    clocks = [clock]
+                ), key=('p', dot))
+            return
         self._collab.post(dict(
                 action = 'p',
-                payload = json_dump([dot, color])
-            ))
+                payload = json_dump([dot, color]),
+                clocks = [clock]
+            ), key=('p', dot))
 
-    def _receive_dot_click(self, payload):
+    def _receive_dot_click(self, payload, clocks=None, author=''):
         ''' When a dot is clicked, everyone should change its color. '''
         (dot, color) = json_load(payload)
-        self._game.remote_button_press(dot, color)
-
+        if clocks is None:
+            self._game.remote_button_press(dot, color)
+        else:
+            self._game.remote_button_press(dot, color, clocks[0], author)
+
+    def send_dot_clicks(self, changes, clocks):
+        ''' Send a batch of (dot, color) to all the players '''
+        if self._use_codec():
+            self._collab.post(dict(
+                    action = 'P',
+                    payload = encode_clicks(changes),
+                    clocks = clocks
+                ))
+            return
+        # Older players only understand one dot per message
+        for (dot, color), clock in zip(changes, clocks):
+            self.send_dot_click(dot, color, clock)
+
+    def __checksum_cb(self):
+        ''' Periodically let the other players check their boards '''
+        if self._buddies and self._buddies <= self._codec_buddies:
+            self._collab.post(dict(
+                    action = 'c',
+                    payload = self._game.checksums()
+                ), key='c')
+        return True
+
+    def _receive_checksums(self, payload):
+        ''' Broadcast the rows of our board that differ from a player's
+        checksums, so that every player merges the newer edits.  Each
+        player that differs answers, so replies for the same rows that
+        are still waiting to be sent are coalesced. '''
+        [columns, rows, checksum, row_checksums] = payload
+        mine = self._game.checksums()
+        if mine[:2] != [columns, rows] or mine[2] == checksum:
+            return
+        differ = [y for y in range(rows) if mine[3][y] != row_checksums[y]]
+        _logger.debug('boards differ in rows %r', differ)
+        self._collab.post(dict(
+                action = 'r',
+                payload = self._game.rows_state(differ)
+            ), key=('r', tuple(differ)))
+
+
+def _buddy_key(buddy):
+    ''' A stable identifier for a buddy, or None for an unknown one '''
+    if buddy is None:
+        return None
+    if isinstance(buddy, dict):  # one to one chat
+        return buddy.get('nick')
+    return buddy.props.key
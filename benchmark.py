@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+''' Micro-benchmarks for the Reflection game engine.
+
+Run from the activity directory, without a Sugar session:
+
+    python3 benchmark.py [name ...]
+
+The board benchmarks only need the standard library; the others drive
+a Game through the headless harness, which needs GTK and Cairo (but no
+display).  The loopback benchmark also needs the modules collabwrapper
+imports (dbus, Telepathy and sugar3).  Benchmarks whose modules are
+missing are skipped.
+'''
+
+import sys
+import timeit
+from random import randrange
+
+from board import Board, ORIENTATIONS
+
+BOARD_SIZES = [(10, 6), (40, 24), (100, 60)]
+
+
+def _require_gtk():
+    import gi
+    try:
+        gi.require_version('Gtk', '3.0')
+    except ValueError as error:
+        raise ImportError(str(error))
+
+
+def _require_collab():
+    _require_gtk()
+    import collabwrapper  # noqa: F401
+
+
+def _report(name, seconds, number):
+    print('%-32s %10.1f us' % (name, seconds * 1e6 / number))
+
+
+def bench_board(number=10000):
+    ''' Time cell updates and symmetry checks on the board model '''
+    for orientation in ORIENTATIONS:
+        board = Board(10, 6, orientation)
+        cells = [randrange(len(board)) for i in range(number)]
+        colors = [randrange(4) for i in range(number)]
+
+        def update():
+            for i, color in zip(cells, colors):
+                board.set(i, color)
+                board.is_symmetric()
+
+        _report('board %s: set + check' % orientation,
+                timeit.timeit(update, number=1), number)
+
+
+def bench_history(number=10000):
+    ''' Time recording moves, undoing them and replaying the history '''
+    from history import History
+
+    board = Board(100, 60)
+    history = History(board.cells)
+    moves = [[(randrange(len(board)), randrange(4)) for j in range(4)]
+             for i in range(number)]
+
+    def record():
+        for move in moves:
+            history.record([(i, board.set(i, color), color)
+                            for i, color in move])
+
+    def undo():
+        for i in range(number):
+            for cell, color in history.undo(board.cells):
+                board.set(cell, color)
+
+    _report('history: record a move', timeit.timeit(record, number=1),
+            number)
+    _report('history: replay %d edits' % len(history),
+            timeit.timeit(history.replay, number=100), 100)
+    _report('history: undo a move', timeit.timeit(undo, number=1), number)
+
+
+def bench_recorder(number=20000):
+    ''' Time recording a long session and seeking in its replay '''
+    import os
+    import tempfile
+    from recorder import Recorder, Replay
+
+    board = Board(40, 24)
+    fd, path = tempfile.mkstemp(suffix='.rec')
+    os.close(fd)
+    try:
+        recorder = Recorder(path)
+        recorder.new_game(board.to_list(), board.orientation,
+                          board.columns, board.rows, when=recorder._start)
+        moves = [[(randrange(len(board)), randrange(4))]
+                 for i in range(number)]
+
+        def record():
+            for n, move in enumerate(moves):
+                recorder.edits(move, when=recorder._start + n * 0.1)
+
+        _report('recorder: record a move', timeit.timeit(record, number=1),
+                number)
+        recorder.close()
+        replay = Replay(path)
+        _report('recorder: open %d records' % len(replay),
+                timeit.timeit(lambda: Replay(path), number=10), 10)
+        times = [randrange(int(replay.duration)) for i in range(100)]
+        _report('recorder: seek',
+                timeit.timeit(lambda: [replay.seek(t) for t in times],
+                              number=1), len(times))
+    finally:
+        os.remove(path)
+
+
+def bench_journal(number=100):
+    ''' Time saving and restoring the game state for the Journal '''
+    from codec import encode_state, decode_state
+
+    for columns, rows in BOARD_SIZES:
+        dot_list = [randrange(11) for i in range(columns * rows)]
+        state = encode_state(dot_list, 'bilateral', columns, rows)
+        name = '%dx%d' % (columns, rows)
+        _report('%s: encode state' % name,
+                timeit.timeit(lambda: encode_state(dot_list, 'bilateral',
+                                                   columns, rows),
+                              number=number), number)
+        _report('%s: decode state' % name,
+                timeit.timeit(lambda: decode_state(state),
+                              number=number), number)
+
+
+def bench_renderers(number=50):
+    ''' Compare the rendering cost of the Cairo and SVG backends '''
+    _require_gtk()
+    from headless import HeadlessGame
+    from game import RENDERER_CAIRO, RENDERER_SVG
+
+    for renderer in [RENDERER_CAIRO, RENDERER_SVG]:
+        harness = HeadlessGame(renderer=renderer)
+        game = harness.game
+        _report('%s: full frame' % renderer,
+                timeit.timeit(harness.paint_all, number=number), number)
+
+        def cold_dots():
+            game._sprites.clear_image_cache()
+            for color in game._colors:
+                game._sprites.cached_image(*game._dot_source(color))
+
+        def bars():
+            game._sprites.clear_image_cache()
+            game._sprites.cached_image(*game._line_source(True))
+            game._sprites.cached_image(*game._line_source(False))
+
+        _report('%s: all dot colors (cold)' % renderer,
+                timeit.timeit(cold_dots, number=number), number)
+        _report('%s: both bars' % renderer,
+                timeit.timeit(bars, number=number), number)
+
+
+def bench_scale(number=10):
+    ''' Time re-rendering after the scale factor or size changes '''
+    _require_gtk()
+    from headless import HeadlessGame, WIDTH, HEIGHT
+
+    for columns, rows in BOARD_SIZES:
+        harness = HeadlessGame(columns=columns, rows=rows)
+        game = harness.game
+        game.new_game('bilateral')
+        name = '%dx%d' % (columns, rows)
+
+        def rescale():
+            for scale in [2, 1]:
+                harness.set_scale_factor(scale)
+                game._sprites.flush_refresh()
+
+        def resize():
+            for width, height in [(WIDTH // 2, HEIGHT // 2),
+                                  (WIDTH, HEIGHT)]:
+                harness.resize(width, height)
+                game._sprites.flush_refresh()
+
+        _report('%s: change scale factor' % name,
+                timeit.timeit(rescale, number=number), number * 2)
+        _report('%s: resize' % name,
+                timeit.timeit(resize, number=number), number * 2)
+
+
+def bench_board_sizes(number=200):
+    ''' Time click-to-paint latency against the size of the board '''
+    _require_gtk()
+    from headless import HeadlessGame
+
+    for columns, rows in BOARD_SIZES:
+        harness = HeadlessGame(columns=columns, rows=rows)
+        game = harness.game
+        game.new_game('bilateral')
+        game.playing_with_robot = True
+        harness.paint()
+        dots = [randrange(len(game._dots)) for i in range(number)]
+        points = [harness.dot_center(i) for i in dots]
+
+        def click():
+            for x, y in points:
+                harness.click(x, y)
+                harness.paint()
+
+        _report('%dx%d: click to paint' % (columns, rows),
+                timeit.timeit(click, number=1), number)
+        _report('%dx%d: full frame' % (columns, rows),
+                timeit.timeit(harness.paint_all, number=10), 10)
+
+
+def bench_game(number=100):
+    ''' Time the game engine entry points on a headless game '''
+    _require_gtk()
+    from headless import HeadlessGame
+
+    for columns, rows in BOARD_SIZES:
+        harness = HeadlessGame(columns=columns, rows=rows)
+        game = harness.game
+        name = '%dx%d' % (columns, rows)
+        game.new_game('bilateral')
+        saved = game.save_game()
+        sprites = [game._dots[randrange(len(game._dots))]
+                   for i in range(number)]
+        points = [harness.dot_center(randrange(len(game._dots)))
+                  for i in range(number)]
+
+        _report('%s: new_game' % name,
+                timeit.timeit(lambda: game.new_game('bilateral'),
+                              number=10), 10)
+        _report('%s: restore_game' % name,
+                timeit.timeit(lambda: game.restore_game(*saved),
+                              number=10), 10)
+
+        def increment():
+            for spr in sprites:
+                game._increment_dot_cb(spr)
+
+        game.playing_with_robot = True
+        _report('%s: _increment_dot_cb' % name,
+                timeit.timeit(increment, number=1), number)
+        _report('%s: _test_game_over' % name,
+                timeit.timeit(game._test_game_over, number=number), number)
+
+        def find():
+            for point in points:
+                game._sprites.find_sprite(point)
+
+        _report('%s: find_sprite' % name,
+                timeit.timeit(find, number=1), number)
+        harness.canvas.damage = []
+        _report('%s: redraw_sprites (full)' % name,
+                timeit.timeit(harness.paint_all, number=10), 10)
+
+
+class _Player():
+    ''' A player of a shared game over the loopback transport, keeping
+    only the board model '''
+
+    def __init__(self, hub, nick, columns, rows):
+        from collabwrapper import CollabWrapper
+
+        self.board = Board(columns, rows)
+        self.collab = CollabWrapper(self, transport=hub.transport(nick))
+        self.collab.connect('message', self._message_cb)
+        self.collab.setup()
+
+    def get_data(self):
+        from codec import encode_game
+        return dict(game=encode_game(self.board.to_list(),
+                                     self.board.orientation,
+                                     self.board.columns, self.board.rows),
+                    clock=self.board.clock)
+
+    def set_data(self, data):
+        from codec import decode_game
+        dot_list, orientation, columns, rows = decode_game(data['game'])
+        self.board.load(dot_list, orientation, data.get('clock', 0))
+
+    def click(self, i, color):
+        from codec import encode_clicks
+        clock = self.board.write(i, color, self.collab.props.session)
+        self.collab.post(dict(action='P',
+                              payload=encode_clicks([(i, color)]),
+                              clocks=[clock]), key=('p', i))
+
+    def _message_cb(self, collab, buddy, message):
+        from codec import decode_clicks
+        if message.get('action') != 'P':
+            return
+        for (i, color), clock in zip(decode_clicks(message['payload']),
+                                     message['clocks']):
+            self.board.merge(i, color, clock, message['_sender'])
+
+
+def bench_loopback(clicks=100):
+    ''' Time message fan-out and convergence between players sharing
+    a game over the loopback transport '''
+    _require_collab()
+    from loopback import LoopbackHub
+
+    for participants in [2, 8, 32]:
+        hub = LoopbackHub()
+        players = [_Player(hub, 'player%d' % n, 40, 24)
+                   for n in range(participants)]
+        hub.run()
+        start = hub.stats
+        name = '%d players' % participants
+
+        moves = [(player, randrange(len(player.board)), randrange(4))
+                 for player in players for i in range(clicks)]
+        started = timeit.default_timer()
+        for player, i, color in moves:
+            player.click(i, color)
+        hub.run()
+        elapsed = timeit.default_timer() - started
+
+        stats = hub.stats
+        delivered = stats['delivered'] - start['delivered']
+        converged = len(set(player.board.checksum()
+                            for player in players)) == 1
+        print('%-32s %10.0f msg/s' % ('%s: throughput' % name,
+                                      delivered / elapsed))
+        _report('%s: max fan-out latency' % name, stats['max_latency'], 1)
+        _report('%s: convergence%s' % (name, '' if converged else ' (FAILED)'),
+                elapsed, 1)
+
+
+BENCHMARKS = {
+    'board': bench_board,
+    'board_sizes': bench_board_sizes,
+    'game': bench_game,
+    'history': bench_history,
+    'journal': bench_journal,
+    'recorder': bench_recorder,
+    'loopback': bench_loopback,
+    'renderers': bench_renderers,
+    'scale': bench_scale,
+}
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or sorted(BENCHMARKS):
+        try:
+            BENCHMARKS[name]()
+        except ImportError as error:
+            print('%-32s skipped (%s)' % (name, error))
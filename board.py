@@ -0,0 +1,167 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+''' A compact model of the Reflection board that does not need GTK.
+
+The cells are kept in a bytearray, one color index per cell, and the
+mirror image of every cell is looked up in precomputed tables.  The
+board keeps count of the mirror pairs whose colors differ, updating it
+as each cell changes, so checking for symmetry is a comparison with
+zero.
+
+Each cell also remembers the Lamport time and author of its last edit,
+so that edits arriving from other players in any order settle on the
+same board: the latest edit wins.
+'''
+
+import zlib
+from array import array
+
+HORIZONTAL = 'horizontal'
+VERTICAL = 'vertical'
+BILATERAL = 'bilateral'
+ORIENTATIONS = [HORIZONTAL, VERTICAL, BILATERAL]
+
+
+def mirror_tables(columns, rows):
+    ''' Return the horizontal and vertical mirror of every cell index '''
+    horizontal = array('I', [0]) * (columns * rows)
+    vertical = array('I', [0]) * (columns * rows)
+    for y in range(rows):
+        for x in range(columns):
+            i = x + y * columns
+            horizontal[i] = (columns - x - 1) + y * columns
+            vertical[i] = x + (rows - y - 1) * columns
+    return horizontal, vertical
+
+
+class Board():
+    ''' The color of every dot and the orientation of the game '''
+
+    def __init__(self, columns, rows, orientation=HORIZONTAL, color=2):
+        if columns % 2 or rows % 2:
+            raise ValueError('Grid dimensions must be even (%dx%d)' %
+                             (columns, rows))
+        self.columns = columns
+        self.rows = rows
+        self.cells = bytearray([color]) * (columns * rows)
+        self.clocks = array('L', [0]) * (columns * rows)
+        self.authors = [''] * (columns * rows)
+        self.clock = 0  # Lamport clock
+        self._horizontal, self._vertical = mirror_tables(columns, rows)
+        self.set_orientation(orientation)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def set_orientation(self, orientation):
+        ''' Change the reflection and recount the mismatched pairs '''
+        if orientation not in ORIENTATIONS:
+            raise ValueError('Unknown orientation %r' % orientation)
+        self.orientation = orientation
+        self.mismatches = 0
+        for i in range(len(self.cells)):
+            for j in self._partners(i):
+                if j > i and self.cells[i] != self.cells[j]:
+                    self.mismatches += 1
+
+    def _partners(self, i):
+        ''' The cells that must match cell i '''
+        if self.orientation == HORIZONTAL:
+            return (self._horizontal[i],)
+        elif self.orientation == VERTICAL:
+            return (self._vertical[i],)
+        return (self._horizontal[i], self._vertical[i])
+
+    def mirrors(self, i):
+        ''' Every reflection of cell i (not including i) '''
+        h = self._horizontal[i]
+        v = self._vertical[i]
+        if self.orientation == HORIZONTAL:
+            return [h]
+        elif self.orientation == VERTICAL:
+            return [v]
+        return [h, v, self._vertical[h]]
+
+    def get(self, i):
+        return self.cells[i]
+
+    def set(self, i, color):
+        ''' Set the color of cell i and return its old color '''
+        old = self.cells[i]
+        if old != color:
+            for j in self._partners(i):
+                partner = self.cells[j]
+                self.mismatches += (color != partner) - (old != partner)
+            self.cells[i] = color
+        return old
+
+    def write(self, i, color, author=''):
+        ''' Set cell i as a new edit by author and return its time '''
+        self.clock += 1
+        self.set(i, color)
+        self.clocks[i] = self.clock
+        self.authors[i] = author
+        return self.clock
+
+    def observe(self, clock):
+        ''' Move the clock past an edit made elsewhere at clock '''
+        if clock > self.clock:
+            self.clock = clock
+
+    def merge(self, i, color, clock, author=''):
+        ''' Apply an edit made elsewhere if it is newer than the last
+        edit of cell i (ties are broken by author, then color).
+        Return True if it was applied. '''
+        self.observe(clock)
+        if (clock, author, color) <= \
+                (self.clocks[i], self.authors[i], self.cells[i]):
+            return False
+        self.set(i, color)
+        self.clocks[i] = clock
+        self.authors[i] = author
+        return True
+
+    def checksum(self):
+        ''' A cheap checksum of the colors of every cell '''
+        return zlib.adler32(self.cells)
+
+    def row_checksums(self):
+        ''' A checksum of the colors of each row '''
+        return [zlib.adler32(self.cells[y * self.columns:
+                                        (y + 1) * self.columns])
+                for y in range(self.rows)]
+
+    def row_state(self, y):
+        ''' The colors, times and authors of the cells in row y '''
+        cells = slice(y * self.columns, (y + 1) * self.columns)
+        return [list(self.cells[cells]), list(self.clocks[cells]),
+                self.authors[cells]]
+
+    def load(self, colors, orientation=None, clock=0):
+        ''' Replace every cell (and optionally the orientation) with a
+        snapshot taken at clock.  The cells are stamped with that time,
+        so that edits older than the snapshot cannot overwrite it. '''
+        if len(colors) != len(self.cells):
+            raise ValueError('Expected %d cells, got %d' %
+                             (len(self.cells), len(colors)))
+        self.cells[:] = bytes(colors)
+        self.clocks = array('L', [clock]) * len(self.cells)
+        self.authors = [''] * len(self.cells)
+        self.observe(clock)
+        if orientation is None:
+            orientation = self.orientation
+        self.set_orientation(orientation)
+
+    def to_list(self):
+        return list(self.cells)
+
+    def is_symmetric(self):
+        return self.mismatches == 0
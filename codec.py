@@ -0,0 +1,155 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+''' Compact encoding of game state and dot clicks for sharing.
+
+Every record starts with a version byte.  Cells are packed two to a
+byte (there are only 11 colors).  Games and clicks are base64 encoded
+so that they can travel over the Telepathy text channel; the saved
+state of a game is kept as bytes for the Journal.
+
+game:   version, orientation, columns (uint16), rows (uint16), cells
+clicks: version, count (uint16), count x (dot (uint32), color)
+state:  version, orientation, flags, columns (uint16), rows (uint16),
+        cells
+
+The decoders raise ValueError for anything they cannot decode.
+'''
+
+import binascii
+import struct
+from base64 import b64encode, b64decode
+
+from board import ORIENTATIONS
+
+CODEC_VERSION = 1
+STATE_VERSION = 1
+
+# Flags of a saved state
+FLAG_ROYGBIV = 1
+FLAG_ROBOT = 2
+
+_GAME_HEADER = struct.Struct('>BBHH')
+_CLICKS_HEADER = struct.Struct('>BH')
+_CLICK = struct.Struct('>IB')
+_STATE_HEADER = struct.Struct('>BBBHH')
+
+# The high and low nibble of every byte
+_HIGH = bytes(i >> 4 for i in range(256))
+_LOW = bytes(i & 0x0F for i in range(256))
+
+
+def pack_cells(cells):
+    ''' Pack a sequence of colors (0-15) two to a byte '''
+    cells = bytes(cells)
+    if len(cells) % 2:
+        cells += b'\0'
+    return bytes(high << 4 | low
+                 for high, low in zip(cells[0::2], cells[1::2]))
+
+
+def unpack_cells(data, count):
+    ''' Unpack count colors packed by pack_cells '''
+    data = bytes(data[:(count + 1) // 2])
+    if len(data) * 2 < count:
+        raise ValueError('Expected %d cells, got %d' % (count, len(data) * 2))
+    cells = bytearray(len(data) * 2)
+    cells[0::2] = data.translate(_HIGH)
+    cells[1::2] = data.translate(_LOW)
+    del cells[count:]
+    return cells
+
+
+def _check_version(data, version=CODEC_VERSION):
+    if not data or data[0] != version:
+        raise ValueError('Unsupported codec version %r' %
+                         (data[0] if data else None))
+
+
+def _decode_text(text):
+    ''' The bytes of base64 text '''
+    try:
+        return b64decode(text, validate=True)
+    except (TypeError, binascii.Error) as error:
+        raise ValueError('Not base64: %s' % error)
+
+
+def _unpack_header(header, data):
+    if len(data) < header.size:
+        raise ValueError('Truncated header (%d bytes)' % len(data))
+    return header.unpack_from(data)
+
+
+def _check_board(orientation, columns, rows):
+    ''' Return the name of the orientation of a valid board '''
+    if orientation >= len(ORIENTATIONS):
+        raise ValueError('Unknown orientation %d' % orientation)
+    if columns <= 0 or rows <= 0 or columns % 2 or rows % 2:
+        raise ValueError('Bad grid dimensions (%dx%d)' % (columns, rows))
+    return ORIENTATIONS[orientation]
+
+
+def encode_game(dot_list, orientation, columns, rows):
+    ''' Encode a game as text '''
+    return b64encode(
+        _GAME_HEADER.pack(CODEC_VERSION, ORIENTATIONS.index(orientation),
+                          columns, rows) +
+        pack_cells(dot_list)).decode('ascii')
+
+
+def decode_game(text):
+    ''' Decode text from encode_game into
+    [dot_list, orientation, columns, rows] '''
+    data = _decode_text(text)
+    _check_version(data)
+    version, orientation, columns, rows = _unpack_header(_GAME_HEADER, data)
+    orientation = _check_board(orientation, columns, rows)
+    cells = unpack_cells(data[_GAME_HEADER.size:], columns * rows)
+    return [list(cells), orientation, columns, rows]
+
+
+def encode_state(dot_list, orientation, columns, rows, roygbiv=False,
+                 robot=False):
+    ''' Encode everything needed to resume a game as bytes '''
+    flags = (FLAG_ROYGBIV if roygbiv else 0) | (FLAG_ROBOT if robot else 0)
+    return _STATE_HEADER.pack(STATE_VERSION, ORIENTATIONS.index(orientation),
+                              flags, columns, rows) + pack_cells(dot_list)
+
+
+def decode_state(data):
+    ''' Decode bytes from encode_state into
+    [dot_list, orientation, columns, rows, roygbiv, robot] '''
+    _check_version(data, STATE_VERSION)
+    version, orientation, flags, columns, rows = \
+        _unpack_header(_STATE_HEADER, data)
+    orientation = _check_board(orientation, columns, rows)
+    cells = unpack_cells(data[_STATE_HEADER.size:], columns * rows)
+    return [list(cells), orientation, columns, rows,
+            bool(flags & FLAG_ROYGBIV), bool(flags & FLAG_ROBOT)]
+
+
+def encode_clicks(changes):
+    ''' Encode a list of (dot, color) as text '''
+    data = bytearray(_CLICKS_HEADER.pack(CODEC_VERSION, len(changes)))
+    for dot, color in changes:
+        data += _CLICK.pack(dot, color)
+    return b64encode(bytes(data)).decode('ascii')
+
+
+def decode_clicks(text):
+    ''' Decode text from encode_clicks into a list of (dot, color) '''
+    data = _decode_text(text)
+    _check_version(data)
+    version, count = _unpack_header(_CLICKS_HEADER, data)
+    if len(data) < _CLICKS_HEADER.size + count * _CLICK.size:
+        raise ValueError('Expected %d clicks, got %d bytes' %
+                         (count, len(data)))
+    return [_CLICK.unpack_from(data, _CLICKS_HEADER.size + i * _CLICK.size)
+            for i in range(count)]
@@ -64,8 +64,14 @@ Using CollabWrapper
 '''
 
 import os
+import re
 import json
+import mmap
+import codecs
+import time
+import uuid
 import socket
+from collections import OrderedDict, deque
 from gettext import gettext as _
 
 import gi
@@ -101,8 +107,32 @@ _logger = logging.getLogger('CollabWrapper')
 
 ACTION_INIT_REQUEST = '!!ACTION_INIT_REQUEST'
 ACTION_INIT_RESPONSE = '!!ACTION_INIT_RESPONSE'
+ACTION_BATCH = '!!ACTION_BATCH'
+ACTION_HELLO = '!!ACTION_HELLO'
+ACTION_SYNC_RESPONSE = '!!ACTION_SYNC_RESPONSE'
+SYNC_VERSION = 1
+# What this wrapper understands, announced with ACTION_HELLO
+FEATURES = ['batch']
+# Sync responses up to this many characters are sent over the text
+# channel rather than by file transfer
+INLINE_SYNC_LIMIT = 4096
+# A joiner stops waiting for the leader's state after (seconds)
+SYNC_TIMEOUT = 10
 ACTIVITY_FT_MIME = 'x-sugar/from-activity'
 
+# Asynchronous D-Bus calls give up after this many seconds
+DBUS_TIMEOUT = 30
+# Maximum number of text messages sent but not yet acknowledged by
+# the connection manager; more are queued
+MAX_IN_FLIGHT = 4
+
+# Streamed file transfers are read in chunks of (bytes)
+STREAM_CHUNK_SIZE = 64 * 1024
+# A sync response received by file transfer may be up to (bytes)
+MAX_SYNC_SIZE = 16 * 1024 * 1024
+# Mapped transfers send at most this much each time the socket is ready
+MAPPED_CHUNK_SIZE = 256 * 1024
+
 
 class CollabWrapper(GObject.GObject):
     '''
@@ -121,7 +151,12 @@ class CollabWrapper(GObject.GObject):
 
     When the caller joins a shared activity, the leader will call
     `get_data`, and the caller's `set_data` will be called with the
-    result.
+    result.  Small results are sent over the text channel, larger ones
+    by file transfer.  Every posted message carries a sequence number,
+    and the leader's reply says which messages its state already
+    includes.  Messages the joiner receives while waiting are held
+    back, then replayed after `set_data` unless the state already
+    includes them.
 
     The `joined` signal is emitted when the caller joins a shared
     activity.  One or more `buddy_joined` signals will be emitted before
@@ -141,6 +176,15 @@ class CollabWrapper(GObject.GObject):
     Any buddy may call `post` to send a message to all buddies.  Each
     buddy will receive a `message` signal.
 
+    If a coalescing window is set with `set_coalesce_window`, posted
+    messages are queued and sent together as one batch at the end of
+    the window.  A message posted with a `key` replaces any message
+    still queued with the same key, so only the latest update of, for
+    example, one cell of a grid is sent.  The receiving wrapper unpacks
+    the batch and emits one `message` signal per message.  Batches are
+    only sent when every buddy has announced (with ACTION_HELLO) that
+    it unpacks them; otherwise the queued messages go one by one.
+
     The `message` signal is emitted when a `post` is received from any
     buddy.  The signal has two arguments.  The first is a
     :class:`sugar3.presence.buddy.Buddy`. The second is the message.
@@ -152,6 +196,14 @@ class CollabWrapper(GObject.GObject):
     The `incoming_file` signal is emitted when a file transfer is
     received.  The signal has two arguments.  The first is a
     :class:`IncomingFileTransfer`.  The second is the description.
+
+    By default the wrapper uses the Sugar presence service and
+    Telepathy.  Another `transport` may be given instead, such as a
+    :class:`loopback.LoopbackTransport`, which stands in for the shared
+    activity: it has `join` (returning True for the leader), `leave`,
+    `get_owner`, `get_joined_buddies`, `text_channel` and emits
+    `buddy-joined` and `buddy-left`.  Its text channel must carry a
+    sync response of any size, and file transfers are not available.
     '''
 
     message = GObject.Signal('message', arg_types=[object, object])
@@ -160,15 +212,37 @@ class CollabWrapper(GObject.GObject):
     buddy_left = GObject.Signal('buddy_left', arg_types=[object])
     incoming_file = GObject.Signal('incoming_file', arg_types=[object, object])
 
-    def __init__(self, activity):
+    def __init__(self, activity, transport=None):
         _logger.debug('__init__')
         GObject.GObject.__init__(self)
         self.activity = activity
-        self.shared_activity = activity.shared_activity
+        self._transport = transport
+        if transport is None:
+            self.shared_activity = activity.shared_activity
+        else:
+            self.shared_activity = None
         self._leader = False
         self._init_waiting = False
+        self._init_log = []  # (buddy, msg) received while waiting
+        self._init_timeout_id = None
+        self._session = uuid.uuid4().hex
+        self._sequence = 0
+        self._seen = {}  # session -> last sequence number received
         self._text_channel = None
-        self._owner = presenceservice.get_instance().get_owner()
+        self._buddies = set()  # keys of the buddies in the activity
+        self._batch_buddies = set()  # keys of those that unpack batches
+        if transport is None:
+            self._owner = presenceservice.get_instance().get_owner()
+        else:
+            self._owner = transport.get_owner()
+
+        self._coalesce_window = 0
+        self._queue = OrderedDict()
+        self._queue_serial = 0
+        self._queue_started = None
+        self._flush_id = None
+        self._stats = dict(posted=0, coalesced=0, sent=0, flushes=0,
+                           last_flush_latency=0., max_flush_latency=0.)
 
     def setup(self):
         '''
@@ -183,6 +257,15 @@ class CollabWrapper(GObject.GObject):
             `__init__` function.
         '''
         _logger.debug('setup')
+        if self._transport is not None:
+            self.shared_activity = self._transport
+            if self._transport.join():
+                self._leader = True
+                self._setup_text_channel()
+            else:
+                self.__joined_cb(self)
+            return
+
         # Some glue to know if we are launching, joining, or resuming
         # a shared activity.
         if self.shared_activity:
@@ -229,16 +312,21 @@ class CollabWrapper(GObject.GObject):
     def __joined_cb(self, sender):
         '''Callback for when an activity is joined.'''
         _logger.debug('__joined_cb')
-        self.shared_activity = self.activity.shared_activity
+        if self._transport is None:
+            self.shared_activity = self.activity.shared_activity
         if not self.shared_activity:
             return
 
         self._setup_text_channel()
         self._listen_for_channels()
         self._init_waiting = True
+        self._init_timeout_id = GLib.timeout_add_seconds(
+            SYNC_TIMEOUT, self.__init_timeout_cb)
         self.post({'action': ACTION_INIT_REQUEST})
+        self._announce()
 
         for buddy in self.shared_activity.get_joined_buddies():
+            self._buddies.add(_buddy_key(buddy))
             self.buddy_joined.emit(buddy)
 
         self.joined.emit()
@@ -246,9 +334,12 @@ class CollabWrapper(GObject.GObject):
     def _setup_text_channel(self):
         ''' Set up a text channel to use for collaboration. '''
         _logger.debug('_setup_text_channel')
-        self._text_channel = _TextChannelWrapper(
-            self.shared_activity.telepathy_text_chan,
-            self.shared_activity.telepathy_conn)
+        if self._transport is not None:
+            self._text_channel = self._transport.text_channel()
+        else:
+            self._text_channel = _TextChannelWrapper(
+                self.shared_activity.telepathy_text_chan,
+                self.shared_activity.telepathy_conn)
 
         # Tell the text channel what callback to use for incoming
         # text messages.
@@ -261,6 +352,8 @@ class CollabWrapper(GObject.GObject):
 
     def _listen_for_channels(self):
         _logger.debug('_listen_for_channels')
+        if self._transport is not None:
+            return  # no file transfers
         conn = self.shared_activity.telepathy_conn
         conn.connect_to_signal('NewChannels', self.__new_channels_cb)
 
@@ -278,43 +371,121 @@ class CollabWrapper(GObject.GObject):
     def _handle_ft_channel(self, conn, path, props):
         _logger.debug('_handle_ft_channel')
         ft = IncomingFileTransfer(conn, path, props)
-        if ft.description == ACTION_INIT_RESPONSE:
+        if ft.description in (ACTION_INIT_RESPONSE, ACTION_SYNC_RESPONSE):
+            if not self._init_waiting:
+                ft.cancel()
+                return
             ft.connect('ready', self.__ready_cb)
-            ft.accept_to_memory()
+            ft.accept_to_stream(JSONStreamDecoder(MAX_SYNC_SIZE))
         else:
             desc = json.loads(ft.description)
             self.incoming_file.emit(ft, desc)
 
-    def __ready_cb(self, ft, stream):
+    def __ready_cb(self, ft, data):
         _logger.debug('__ready_cb')
         if self._init_waiting:
-            stream.close(None)
-            # FIXME:  The data prop seems to just be the raw pointer
-            gbytes = stream.steal_as_bytes()
-            data = gbytes.get_data()
             _logger.debug('Got init data from buddy: %r', data)
-            data = json.loads(data)
-            self.activity.set_data(data)
-            self._init_waiting = False
+            if ft.description == ACTION_SYNC_RESPONSE:
+                self._apply_sync(data)
+            else:
+                self._apply_sync({'data': data})
+
+    def _apply_sync(self, response):
+        '''Set the leader's state, then replay the messages received
+        while waiting that the state does not include yet.  Messages
+        without a sequence number (from older wrappers, or posted with
+        state=False) are all replayed.'''
+        if self._init_timeout_id is not None:
+            GLib.source_remove(self._init_timeout_id)
+            self._init_timeout_id = None
+        self.activity.set_data(response.get('data'))
+        self._init_waiting = False
+        seen = response.get('seen', {})
+        log = self._init_log
+        self._init_log = []
+        for buddy, msg in log:
+            if '_seq' not in msg or \
+                    msg['_seq'] > seen.get(msg.get('_sender'), 0):
+                self._emit_message(buddy, msg)
+
+    def __init_timeout_cb(self):
+        '''The leader did not answer; stop holding messages back.'''
+        _logger.debug('No init data received')
+        self._init_timeout_id = None
+        self._init_waiting = False
+        log = self._init_log
+        self._init_log = []
+        for buddy, msg in log:
+            self._emit_message(buddy, msg)
+        return False
+
+    def _send_sync(self, buddy, request):
+        '''Send our state to a joining buddy.'''
+        data = self.activity.get_data()
+        if data is None:
+            return
+        if '_sender' not in request:
+            # Older wrapper: only understands a file transfer of the data
+            OutgoingBlobTransfer(
+                buddy,
+                self.shared_activity.telepathy_conn,
+                json.dumps(data),
+                self.get_client_name(),
+                ACTION_INIT_RESPONSE,
+                ACTIVITY_FT_MIME)
+            return
+
+        # Send whatever is queued first, so that it is counted in seen
+        self.flush()
+        seen = dict(self._seen)
+        seen[self._session] = self._sequence
+        response = {'action': ACTION_SYNC_RESPONSE,
+                    'version': SYNC_VERSION,
+                    'to': request['_sender'],
+                    'seen': seen,
+                    'data': data}
+        text = json.dumps(response)
+        if len(text) <= INLINE_SYNC_LIMIT or self._transport is not None:
+            self._text_channel.post(response)
+        else:
+            OutgoingBlobTransfer(
+                buddy,
+                self.shared_activity.telepathy_conn,
+                text,
+                self.get_client_name(),
+                ACTION_SYNC_RESPONSE,
+                ACTIVITY_FT_MIME)
 
     def __received_cb(self, buddy, msg):
         '''Process a message when it is received.'''
         _logger.debug('__received_cb')
         action = msg.get('action')
+        if action == ACTION_BATCH:
+            for message in msg.get('messages', []):
+                self.__received_cb(buddy, message)
+            return
+        if action == ACTION_HELLO:
+            if 'batch' in msg.get('features', []) and buddy is not None:
+                self._batch_buddies.add(_buddy_key(buddy))
+            return
         if action == ACTION_INIT_REQUEST:
             if self._leader:
-                data = self.activity.get_data()
-                if data is not None:
-                    data = json.dumps(data)
-                    OutgoingBlobTransfer(
-                        buddy,
-                        self.shared_activity.telepathy_conn,
-                        data,
-                        self.get_client_name(),
-                        ACTION_INIT_RESPONSE,
-                        ACTIVITY_FT_MIME)
+                self._send_sync(buddy, msg)
             return
+        if action == ACTION_SYNC_RESPONSE:
+            if self._init_waiting and msg.get('to') == self._session:
+                self._apply_sync(msg)
+            return
+
+        if self._init_waiting:
+            self._init_log.append((buddy, msg))
+            return
+        self._emit_message(buddy, msg)
 
+    def _emit_message(self, buddy, msg):
+        if '_seq' in msg:
+            self._seen[msg['_sender']] = max(
+                msg['_seq'], self._seen.get(msg['_sender'], 0))
         if buddy:
             nick = buddy.props.nick
         else:
@@ -364,7 +535,35 @@ class CollabWrapper(GObject.GObject):
             json.dumps(description),
             ACTIVITY_FT_MIME)
 
-    def post(self, msg):
+    def send_file_mapped(self, buddy, source, description):
+        '''
+        Send a one to one file transfer to a buddy without copying the
+        data.  To send the same data to several buddies, make one
+        :class:`MappedSource` and pass it to each call; the data is
+        mapped (or held) once for all of them.
+
+        Args:
+            buddy (sugar3.presence.buddy.Buddy), buddy to send to.
+            source (:class:`MappedSource`, str path, bytes, memoryview
+                or GLib.Bytes), the data to send.
+            description (object), a json encodable description for the
+                transfer.  This will be given to the
+                `incoming_transfer` signal at the buddy.
+
+        Returns: the :class:`OutgoingMappedTransfer`, whose `stats`
+            give the throughput once it is done.
+        '''
+        if not isinstance(source, MappedSource):
+            source = MappedSource(source)
+        return OutgoingMappedTransfer(
+            buddy,
+            self.shared_activity.telepathy_conn,
+            source,
+            self.get_client_name(),
+            json.dumps(description),
+            ACTIVITY_FT_MIME)
+
+    def post(self, msg, key=None, state=True):
         '''
         Send a message to all buddies.  If the activity is not shared,
         no message is sent.
@@ -372,16 +571,118 @@ class CollabWrapper(GObject.GObject):
         Args:
             msg (object): json encodable object to send,
                 eg. :class:`dict` or :class:`str`.
+            key (object): if coalescing is enabled, a message still
+                queued with the same (hashable) key is replaced by this
+                one.
+            state (bool): False for a message that is not part of the
+                state given to joining buddies by `get_data`, such as
+                an announcement.  It is not numbered, so a buddy that
+                receives it while joining always replays it.
         '''
-        if self._text_channel is not None:
+        if self._text_channel is None:
+            return
+        if isinstance(msg, dict):
+            msg = dict(msg, _sender=self._session)
+            if state:
+                self._sequence += 1
+                msg['_seq'] = self._sequence
+        self._stats['posted'] += 1
+        if self._coalesce_window <= 0:
+            self._stats['sent'] += 1
             self._text_channel.post(msg)
+            return
+
+        if key is None:
+            self._queue_serial += 1
+            key = ('', self._queue_serial)
+        else:
+            key = ('key', key)
+            if key in self._queue:
+                self._stats['coalesced'] += 1
+                del self._queue[key]
+        self._queue[key] = msg
+        if self._flush_id is None:
+            self._queue_started = time.time()
+            self._flush_id = GLib.timeout_add(
+                self._coalesce_window, self.flush)
+
+    def _announce(self):
+        '''Tell the other buddies what this wrapper understands.  Older
+        wrappers pass the message on to their activity, which ignores
+        an action it does not know.'''
+        if self._text_channel is not None:
+            self._text_channel.post({'action': ACTION_HELLO,
+                                     'features': FEATURES})
+
+    def flush(self):
+        '''
+        Send any queued messages now, as a single batch if every buddy
+        has announced that it can unpack one, otherwise one by one.
+        '''
+        if self._flush_id is not None:
+            GLib.source_remove(self._flush_id)
+            self._flush_id = None
+        if not self._queue:
+            return False
+        messages = list(self._queue.values())
+        self._queue.clear()
+        if self._text_channel is not None:
+            if len(messages) > 1 and self._buddies <= self._batch_buddies:
+                self._text_channel.post(
+                    {'action': ACTION_BATCH, 'messages': messages})
+            else:
+                for msg in messages:
+                    self._text_channel.post(msg)
+            self._stats['sent'] += len(messages)
+
+        latency = time.time() - self._queue_started
+        self._stats['flushes'] += 1
+        self._stats['last_flush_latency'] = latency
+        self._stats['max_flush_latency'] = max(
+            latency, self._stats['max_flush_latency'])
+        return False
+
+    def set_coalesce_window(self, milliseconds):
+        '''
+        Queue posted messages for up to milliseconds before sending
+        them as one batch.  Zero (the default) sends every message as
+        soon as it is posted.
+        '''
+        self.flush()
+        self._coalesce_window = milliseconds
+
+    @property
+    def queue_depth(self):
+        '''
+        Number of messages waiting to be sent.
+        '''
+        return len(self._queue)
+
+    @property
+    def stats(self):
+        '''
+        A dict of outbound message counters: `posted`, `coalesced`
+        (replaced before being sent), `sent`, `flushes`, and the
+        `last_flush_latency` and `max_flush_latency` in seconds from
+        the first message of a batch being queued to the batch being
+        sent.
+        '''
+        return dict(self._stats, queue_depth=len(self._queue))
 
     def __buddy_joined_cb(self, sender, buddy):
         '''A buddy joined.'''
+        if self._text_channel is not None:
+            self._text_channel.forget_buddy()
+        self._buddies.add(_buddy_key(buddy))
+        self._announce()
         self.buddy_joined.emit(buddy)
 
     def __buddy_left_cb(self, sender, buddy):
         '''A buddy left.'''
+        if self._text_channel is not None:
+            self._text_channel.forget_buddy(buddy)
+        self._buddies.discard(_buddy_key(buddy))
+        self._batch_buddies.discard(_buddy_key(buddy))
         self.buddy_left.emit(buddy)
 
     def get_client_name(self):
@@ -401,6 +702,14 @@ class CollabWrapper(GObject.GObject):
         '''
         return self._leader
 
+    @GObject.Property
+    def session(self):
+        '''
+        A random identifier of this client in the shared activity, used
+        as the sender of every posted message.
+        '''
+        return self._session
+
     @GObject.Property
     def owner(self):
         '''
@@ -511,6 +820,11 @@ class _BaseFileTransfer(GObject.GObject):
 
     state = GObject.property(type=int, getter=_get_state, setter=_set_state)
 
+    def _transfer_error_cb(self, error):
+        _logger.error('File transfer failed: %s', error)
+        self.reason_last_change = FT_REASON_LOCAL_ERROR
+        self.props.state = FT_STATE_CANCELLED
+
     def cancel(self):
         '''
         Request that telepathy close the file transfer channel
@@ -520,18 +834,192 @@ class _BaseFileTransfer(GObject.GObject):
         self.channel[CHANNEL].Close()
 
 
+def _buddy_key(buddy):
+    '''A stable identifier for a buddy'''
+    if isinstance(buddy, dict):  # one to one chat
+        return buddy.get('nick')
+    return buddy.props.key
+
+
+class StreamDecoder(object):
+    '''
+    Receives a file transfer accepted with `accept_to_stream` a chunk at
+    a time.  This one keeps the chunks, up to a limit, and returns them
+    joined; subclasses can decode as the chunks arrive instead.
+
+    Args:
+        limit (int), the most bytes to accept; a longer transfer is
+            cancelled.  None for no limit.
+    '''
+
+    def __init__(self, limit=None):
+        self._limit = limit
+        self._size = 0
+        self._chunks = []
+
+    def _count(self, data):
+        self._size += len(data)
+        if self._limit is not None and self._size > self._limit:
+            raise ValueError('Transfer is larger than %d bytes' % self._limit)
+
+    def feed(self, data):
+        '''Take the next chunk of bytes.  Raise ValueError if the
+        transfer should stop.'''
+        self._count(data)
+        self._chunks.append(data)
+
+    def close(self):
+        '''The transfer is complete; return the result.'''
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+    def cancel(self):
+        '''The transfer stopped early; drop any partial state.'''
+        self._chunks = []
+
+
+# What JSONStreamDecoder looks for outside and inside strings
+_JSON_STRUCTURE = re.compile(r'["\[\]{},]')
+_JSON_STRING = re.compile(r'["\\]')
+
+
+class JSONStreamDecoder(StreamDecoder):
+    '''
+    Decodes UTF-8 text, and the JSON in it, as it arrives.  The members
+    of a top level object or array are parsed one at a time as soon as
+    each is complete, and their text is dropped, so the parsing is
+    spread over the chunks and only the text of one member is held.
+
+    A single large member, or a top level value that is not an object
+    or array, is still parsed in one go once it is complete.
+    '''
+
+    def __init__(self, limit=None):
+        StreamDecoder.__init__(self, limit)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._result = None  # the top level object or array
+        self._scalar = False  # the top level is not a container
+        self._closing = None  # the bracket that ends the top level
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False  # the last chunk ended in a backslash
+        self._members = 0
+
+    def feed(self, data):
+        self._count(data)
+        self._scan(self._decoder.decode(data))
+
+    def _scan(self, text):
+        if not text:
+            return
+        if self._done:
+            if text.strip():
+                raise ValueError('Extra data after the JSON value')
+            return
+        if self._result is None and not self._scalar:
+            start = len(text) - len(text.lstrip())
+            if start == len(text):
+                return
+            if text[start] == '{':
+                self._result, self._closing = {}, '}'
+            elif text[start] == '[':
+                self._result, self._closing = [], ']'
+            else:
+                self._scalar = True
+            if not self._scalar:
+                self._depth = 1
+                text = text[start + 1:]
+        if self._scalar:
+            self._chunks.append(text)
+            return
+
+        start = 0  # of the current member in text
+        pos = 0
+        if self._escape:
+            pos = 1
+            self._escape = False
+        while True:
+            if self._in_string:
+                match = _JSON_STRING.search(text, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if match.group() == '\\':
+                    if pos == len(text):
+                        self._escape = True
+                        break
+                    pos += 1
+                else:
+                    self._in_string = False
+                continue
+            match = _JSON_STRUCTURE.search(text, pos)
+            if match is None:
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self._in_string = True
+            elif char in '[{':
+                self._depth += 1
+            elif char in ']}':
+                self._depth -= 1
+                if self._depth == 0:
+                    if char != self._closing:
+                        raise ValueError('Mismatched %r' % char)
+                    self._member(text[start:match.start()], last=True)
+                    self._done = True
+                    self._scan(text[pos:])
+                    return
+            elif self._depth == 1:
+                self._member(text[start:match.start()])
+                start = pos
+        self._chunks.append(text[start:])
+
+    def _member(self, tail, last=False):
+        '''Parse a complete member of the top level object or array'''
+        text = ''.join(self._chunks) + tail
+        self._chunks = []
+        if not text.strip():
+            if last and self._members == 0:
+                return  # empty
+            raise ValueError('Missing member')
+        self._members += 1
+        if self._closing == '}':
+            self._result.update(json.loads('{%s}' % text))
+        else:
+            self._result.extend(json.loads('[%s]' % text))
+
+    def close(self):
+        self._scan(self._decoder.decode(b'', final=True))
+        if self._scalar:
+            text = ''.join(self._chunks)
+            self._chunks = []
+            return json.loads(text)
+        if not self._done:
+            raise ValueError('Truncated JSON')
+        return self._result
+
+    def cancel(self):
+        StreamDecoder.cancel(self)
+        self._result = None
+
+
 class IncomingFileTransfer(_BaseFileTransfer):
     '''
     An incoming file transfer from another buddy.  You need to first accept
-    the transfer (either to memory or to a file).  Then you need to listen
-    to the state and wait until the transfer is completed.  Then you can
-    read the file that it was saved to, or access the
+    the transfer (to memory, to a file or to a stream decoder).  Then you
+    need to listen to the state and wait until the transfer is completed.
+    Then you can read the file that it was saved to, or access the
     :class:`Gio.MemoryOutputStream` from the `output` property.
 
     The `output` property is different depending on how the file was accepted.
     If the file was accepted to a file on the file system, it is a string
     representing the path to the file.  If the file was accepted to memory,
-    it is a :class:`Gio.MemoryOutputStream`.
+    it is a :class:`Gio.MemoryOutputStream`.  If it was accepted to a
+    stream, it is the decoder, and the `ready` signal passes the result
+    of its `close`.
     '''
 
     ready = GObject.Signal('ready', arg_types=[object])
@@ -551,6 +1039,10 @@ class IncomingFileTransfer(_BaseFileTransfer):
 
         self._destination_path = None
         self._output_stream = None
+        self._decoder = None
+        self._received = 0
+        self._chunk_size = STREAM_CHUNK_SIZE
+        self._cancellable = None
         self._socket_address = None
         self._socket = None
         self._splicer = None
@@ -579,14 +1071,38 @@ class IncomingFileTransfer(_BaseFileTransfer):
         self._destination_path = None
         self._accept()
 
+    def accept_to_stream(self, decoder, chunk_size=STREAM_CHUNK_SIZE):
+        '''
+        Accept the file transfer, and give it to decoder a chunk at a
+        time as it arrives.  Only one chunk is read at a time, so a
+        sender faster than the decoder waits for it.  Progress is
+        reported by the `transferred_bytes` property.
+
+        Args:
+            decoder (:class:`StreamDecoder`), or any object with `feed`,
+                `close` and `cancel` methods
+            chunk_size (int), the most bytes to read at a time
+        '''
+        self._destination_path = None
+        self._decoder = decoder
+        self._chunk_size = chunk_size
+        self._cancellable = Gio.Cancellable()
+        self._accept()
+
     def _accept(self):
         channel_ft = self.channel[CHANNEL_TYPE_FILE_TRANSFER]
-        self._socket_address = channel_ft.AcceptFile(
+        channel_ft.AcceptFile(
             SOCKET_ADDRESS_TYPE_UNIX,
             SOCKET_ACCESS_CONTROL_LOCALHOST,
             '',
             0,
-            byte_arrays=True)
+            byte_arrays=True,
+            reply_handler=self.__accept_file_cb,
+            error_handler=self._transfer_error_cb,
+            timeout=DBUS_TIMEOUT)
+
+    def __accept_file_cb(self, socket_address):
+        self._socket_address = socket_address
 
     def __notify_state_cb(self, file_transfer, pspec):
         _logger.debug('__notify_state_cb %r', self.props.state)
@@ -597,6 +1113,13 @@ class IncomingFileTransfer(_BaseFileTransfer):
             self._socket.connect(self._socket_address)
             input_stream = Gio.UnixInputStream.new(self._socket.fileno(), True)
 
+            if self._decoder is not None:
+                self._received = 0
+                input_stream.read_bytes_async(
+                    self._chunk_size, GLib.PRIORITY_LOW, self._cancellable,
+                    self.__read_cb, None)
+                return
+
             if self._destination_path is not None:
                 destination_file = Gio.File.new_for_path(
                     self._destination_path)
@@ -617,6 +1140,41 @@ class IncomingFileTransfer(_BaseFileTransfer):
                 Gio.OutputStreamSpliceFlags.CLOSE_SOURCE |
                 Gio.OutputStreamSpliceFlags.CLOSE_TARGET,
                 GLib.PRIORITY_LOW, None, self.__splice_done_cb, None)
+        elif self.props.state == FT_STATE_CANCELLED and \
+                self._cancellable is not None:
+            self._cancellable.cancel()
+
+    def __read_cb(self, input_stream, res, user):
+        try:
+            chunk = input_stream.read_bytes_finish(res).get_data()
+            if chunk:
+                self._decoder.feed(chunk)
+            else:
+                input_stream.close(None)
+                result = self._decoder.close()
+        except (GLib.Error, ValueError) as error:
+            _logger.debug('__read_cb %s', error)
+            input_stream.close(None)
+            self._decoder.cancel()
+            if not self._cancellable.is_cancelled():
+                self._cancellable.cancel()
+                self._transfer_error_cb(error)
+                self.channel[CHANNEL].Close()
+            return
+
+        if not chunk:
+            self.ready.emit(result)
+            return
+        self._received += len(chunk)
+        self.props.transferred_bytes = self._received
+        input_stream.read_bytes_async(
+            self._chunk_size, GLib.PRIORITY_LOW, self._cancellable,
+            self.__read_cb, None)
+
+    def cancel(self):
+        if self._cancellable is not None:
+            self._cancellable.cancel()
+        _BaseFileTransfer.cancel(self)
 
     def __splice_done_cb(self, output_stream, res, user):
         _logger.debug('__splice_done_cb')
@@ -624,7 +1182,8 @@ class IncomingFileTransfer(_BaseFileTransfer):
 
     @GObject.Property
     def output(self):
-        return self._destination_path or self._output_stream
+        return self._destination_path or self._decoder or \
+            self._output_stream
 
 
 class _BaseOutgoingTransfer(_BaseFileTransfer):
@@ -634,7 +1193,8 @@ class _BaseOutgoingTransfer(_BaseFileTransfer):
     You can override the `_get_input_stream` method to return any type of
     Gio input stream.  This will then be used to provide the file if
     requested by the application.  You also need to call `_create_channel`
-    with the length of the file in bytes during your `__init__`.
+    with the length of the file in bytes during your `__init__`.  To write
+    to the socket some other way, override `_send`.
 
     Args:
         buddy (sugar3.presence.buddy.Buddy), who to send the transfer to
@@ -659,7 +1219,7 @@ class _BaseOutgoingTransfer(_BaseFileTransfer):
         self.buddy = buddy
 
     def _create_channel(self, file_size):
-        object_path, properties_ = self._conn.CreateChannel(dbus.Dictionary({
+        self._conn.CreateChannel(dbus.Dictionary({
             CHANNEL + '.ChannelType': CHANNEL_TYPE_FILE_TRANSFER,
             CHANNEL + '.TargetHandleType': CONNECTION_HANDLE_TYPE_CONTACT,
             CHANNEL + '.TargetHandle': self.buddy.contact_handle,
@@ -667,7 +1227,12 @@ class _BaseOutgoingTransfer(_BaseFileTransfer):
             CHANNEL_TYPE_FILE_TRANSFER + '.Description': self._description,
             CHANNEL_TYPE_FILE_TRANSFER + '.Size': file_size,
             CHANNEL_TYPE_FILE_TRANSFER + '.ContentType': self._mime,
-            CHANNEL_TYPE_FILE_TRANSFER + '.InitialOffset': 0}, signature='sv'))
+            CHANNEL_TYPE_FILE_TRANSFER + '.InitialOffset': 0}, signature='sv'),
+            reply_handler=self.__create_channel_cb,
+            error_handler=self._transfer_error_cb,
+            timeout=DBUS_TIMEOUT)
+
+    def __create_channel_cb(self, object_path, properties_):
         channel = {}
         proxy = dbus.Bus().get_object(self._conn.bus_name, object_path)
         channel[PROPERTIES_IFACE] = dbus.Interface(proxy, PROPERTIES_IFACE)
@@ -677,9 +1242,15 @@ class _BaseOutgoingTransfer(_BaseFileTransfer):
         self.set_channel(channel)
 
         channel_file_transfer = self.channel[CHANNEL_TYPE_FILE_TRANSFER]
-        self._socket_address = channel_file_transfer.ProvideFile(
+        channel_file_transfer.ProvideFile(
             SOCKET_ADDRESS_TYPE_UNIX, SOCKET_ACCESS_CONTROL_LOCALHOST, '',
-            byte_arrays=True)
+            byte_arrays=True,
+            reply_handler=self.__provide_file_cb,
+            error_handler=self._transfer_error_cb,
+            timeout=DBUS_TIMEOUT)
+
+    def __provide_file_cb(self, socket_address):
+        self._socket_address = socket_address
 
     def _get_input_stream(self):
         raise NotImplementedError()
@@ -690,15 +1261,20 @@ class _BaseOutgoingTransfer(_BaseFileTransfer):
             # closes the fd when it goes out of scope
             self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
             self._socket.connect(self._socket_address)
-            output_stream = Gio.UnixOutputStream.new(
-                self._socket.fileno(), True)
+            self._send()
 
-            input_stream = self._get_input_stream()
-            output_stream.splice_async(
-                input_stream,
-                Gio.OutputStreamSpliceFlags.CLOSE_SOURCE |
-                Gio.OutputStreamSpliceFlags.CLOSE_TARGET,
-                GLib.PRIORITY_LOW, None, None, None)
+    def _send(self):
+        '''Send the file over the connected socket, by splicing the input
+        stream into it.'''
+        output_stream = Gio.UnixOutputStream.new(
+            self._socket.fileno(), True)
+
+        input_stream = self._get_input_stream()
+        output_stream.splice_async(
+            input_stream,
+            Gio.OutputStreamSpliceFlags.CLOSE_SOURCE |
+            Gio.OutputStreamSpliceFlags.CLOSE_TARGET,
+            GLib.PRIORITY_LOW, None, None, None)
 
 
 class OutgoingFileTransfer(_BaseOutgoingTransfer):
@@ -747,13 +1323,26 @@ class OutgoingBlobTransfer(_BaseOutgoingTransfer):
 class _TextChannelWrapper(object):
     '''Wrapper for a telepathy Text Channel'''
 
-    def __init__(self, text_chan, conn):
-        '''Connect to the text channel'''
+    def __init__(self, text_chan, conn, async_calls=True):
+        '''Connect to the text channel.  Unless async_calls is False,
+        sending and acknowledging messages does not wait for D-Bus.'''
+        self._async = async_calls
+        self._in_flight = 0
+        self._outbox = deque()
+        self._alias_waiting = {}  # handle -> messages awaiting its alias
         self._activity_cb = None
         self._activity_close_cb = None
         self._text_chan = text_chan
         self._conn = conn
         self._signal_matches = []
+        # Buddy resolution, cached until buddies join or leave
+        self._buddies = {}  # channel-specific handle -> Buddy
+        self._aliases = {}  # handle -> nick, for one to one chats
+        self._tp_name = None
+        self._tp_path = None
+        self._self_handle = None
+        self._self_cs_handle = None
+        self._group_flags = None
         m = self._text_chan[CHANNEL_INTERFACE].connect_to_signal(
             'Closed', self._closed_cb)
         self._signal_matches.append(m)
@@ -767,9 +1356,49 @@ class _TextChannelWrapper(object):
         '''Send text over the Telepathy text channel.'''
         _logger.debug('sending %s' % text)
 
-        if self._text_chan is not None:
+        if self._text_chan is None:
+            return
+        if not self._async:
             self._text_chan[CHANNEL_TYPE_TEXT].Send(
                 CHANNEL_TEXT_MESSAGE_TYPE_NORMAL, text)
+            return
+        self._outbox.append(text)
+        self._send_outbox()
+
+    def _send_outbox(self):
+        '''Send queued text while there is room in flight.'''
+        while self._outbox and self._in_flight < MAX_IN_FLIGHT and \
+                self._text_chan is not None:
+            self._in_flight += 1
+            self._text_chan[CHANNEL_TYPE_TEXT].Send(
+                CHANNEL_TEXT_MESSAGE_TYPE_NORMAL, self._outbox.popleft(),
+                reply_handler=self.__send_reply_cb,
+                error_handler=self.__send_error_cb,
+                timeout=DBUS_TIMEOUT)
+
+    def __send_reply_cb(self, *args):
+        self._in_flight -= 1
+        self._send_outbox()
+
+    def __send_error_cb(self, error):
+        _logger.error('Sending a message failed: %s', error)
+        self._in_flight -= 1
+        self._send_outbox()
+
+    def _acknowledge(self, identity):
+        '''Acknowledge a received message.'''
+        if self._text_chan is None:
+            return
+        if not self._async:
+            self._text_chan[
+                CHANNEL_TYPE_TEXT].AcknowledgePendingMessages([identity])
+            return
+        self._text_chan[CHANNEL_TYPE_TEXT].AcknowledgePendingMessages(
+            [identity],
+            reply_handler=lambda: None,
+            error_handler=lambda error: _logger.error(
+                'Acknowledging a message failed: %s', error),
+            timeout=DBUS_TIMEOUT)
 
     def close(self):
         '''Close the text channel.'''
@@ -826,25 +1455,52 @@ class _TextChannelWrapper(object):
                 self._text_chan[CHANNEL_INTERFACE_GROUP]
             except Exception:
                 # One to one XMPP chat
-                nick = self._conn[
-                    CONN_INTERFACE_ALIASING].RequestAliases([sender])[0]
-                buddy = {'nick': nick, 'color': '#000000,#808080'}
-                _logger.debug('exception: received from sender %r buddy %r' %
-                              (sender, buddy))
+                if sender in self._aliases:
+                    self._deliver_one_to_one(sender, identity, msg)
+                elif not self._async:
+                    self._aliases[sender] = self._conn[
+                        CONN_INTERFACE_ALIASING].RequestAliases([sender])[0]
+                    self._deliver_one_to_one(sender, identity, msg)
+                elif sender in self._alias_waiting:
+                    self._alias_waiting[sender].append((identity, msg))
+                else:
+                    self._alias_waiting[sender] = [(identity, msg)]
+                    self._conn[CONN_INTERFACE_ALIASING].RequestAliases(
+                        [sender],
+                        reply_handler=lambda aliases:
+                            self.__aliases_cb(sender, aliases[0]),
+                        error_handler=lambda error:
+                            self.__aliases_cb(sender, str(sender), error),
+                        timeout=DBUS_TIMEOUT)
             else:
-                # XXX: cache these
                 buddy = self._get_buddy(sender)
                 _logger.debug('Else: received from sender %r buddy %r' %
                               (sender, buddy))
-
-            self._activity_cb(buddy, msg)
-            self._text_chan[
-                CHANNEL_TYPE_TEXT].AcknowledgePendingMessages([identity])
+                self._activity_cb(buddy, msg)
+                self._acknowledge(identity)
         else:
             _logger.debug('Throwing received message on the floor'
                           ' since there is no callback connected. See'
                           ' set_received_callback')
 
+    def __aliases_cb(self, sender, nick, error=None):
+        '''Deliver the messages that were waiting for a nick.'''
+        if error is not None:
+            _logger.error('Requesting an alias failed: %s', error)
+        else:
+            self._aliases[sender] = nick
+        for identity, msg in self._alias_waiting.pop(sender, []):
+            self._deliver_one_to_one(sender, identity, msg, nick)
+
+    def _deliver_one_to_one(self, sender, identity, msg, nick=None):
+        if nick is None:
+            nick = self._aliases[sender]
+        buddy = {'nick': nick, 'color': '#000000,#808080'}
+        _logger.debug('exception: received from sender %r buddy %r' %
+                      (sender, buddy))
+        self._activity_cb(buddy, msg)
+        self._acknowledge(identity)
+
     def set_closed_callback(self, callback):
         '''Connect a callback for when the text channel is closed.
 
@@ -854,24 +1510,43 @@ class _TextChannelWrapper(object):
         _logger.debug('set closed callback')
         self._activity_close_cb = callback
 
+    def forget_buddy(self, buddy=None):
+        '''Drop a buddy from the resolution cache, or every buddy if
+        buddy is None (handles may be reused once buddies join).'''
+        if buddy is None:
+            self._buddies = {}
+            self._aliases = {}
+            return
+        for handle, cached in list(self._buddies.items()):
+            if cached == buddy:
+                del self._buddies[handle]
+
     def _get_buddy(self, cs_handle):
         '''Get a Buddy from a (possibly channel-specific) handle.'''
         # XXX This will be made redundant once Presence Service
         # provides buddy resolution
+        if cs_handle in self._buddies:
+            return self._buddies[cs_handle]
 
         # Get the Presence Service
         pservice = presenceservice.get_instance()
 
-        # Get the Telepathy Connection
-        tp_name, tp_path = pservice.get_preferred_connection()
-        obj = dbus.Bus().get_object(tp_name, tp_path)
-        conn = dbus.Interface(obj, CONN_INTERFACE)
-        group = self._text_chan[CHANNEL_INTERFACE_GROUP]
-        my_csh = group.GetSelfHandle()
-        if my_csh == cs_handle:
-            handle = conn.GetSelfHandle()
-        elif group.GetGroupFlags() & \
+        if self._tp_name is None:
+            # Get the Telepathy Connection and our handles, once
+            tp_name, tp_path = pservice.get_preferred_connection()
+            obj = dbus.Bus().get_object(tp_name, tp_path)
+            conn = dbus.Interface(obj, CONN_INTERFACE)
+            group = self._text_chan[CHANNEL_INTERFACE_GROUP]
+            self._self_cs_handle = group.GetSelfHandle()
+            self._self_handle = conn.GetSelfHandle()
+            self._group_flags = group.GetGroupFlags()
+            self._tp_name, self._tp_path = tp_name, tp_path
+
+        if self._self_cs_handle == cs_handle:
+            handle = self._self_handle
+        elif self._group_flags & \
               CHANNEL_GROUP_FLAG_CHANNEL_SPECIFIC_HANDLES:
+            group = self._text_chan[CHANNEL_INTERFACE_GROUP]
             handle = group.GetHandleOwners([cs_handle])[0]
         else:
             handle = cs_handle
@@ -879,5 +1554,155 @@ class _TextChannelWrapper(object):
             # XXX: deal with failure to get the handle owner
             assert handle != 0
 
-        return pservice.get_buddy_by_telepathy_handle(
-            tp_name, tp_path, handle)
+        buddy = pservice.get_buddy_by_telepathy_handle(
+            self._tp_name, self._tp_path, handle)
+        if buddy is not None:
+            self._buddies[cs_handle] = buddy
+        return buddy
+
+
+class MappedSource(object):
+    '''
+    Data for one or more :class:`OutgoingMappedTransfer`.  A file is
+    memory mapped (and sent straight from the file with `os.sendfile`
+    where the system has it); bytes, a memoryview or GLib.Bytes are
+    used as they are.  The file is unmapped when the last transfer
+    using it is done.
+
+    Args:
+        source (str path, bytes, memoryview or GLib.Bytes)
+    '''
+
+    def __init__(self, source):
+        self._file = None
+        self._map = None
+        self._users = 0
+        if isinstance(source, str):
+            self._file = open(source, 'rb')
+            size = os.fstat(self._file.fileno()).st_size
+            if size:
+                self._map = mmap.mmap(self._file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+                self.view = memoryview(self._map)
+            else:
+                self.view = memoryview(b'')
+        elif isinstance(source, GLib.Bytes):
+            self.view = memoryview(source.get_data())
+        else:
+            self.view = memoryview(source).cast('B')
+
+    def __len__(self):
+        return len(self.view)
+
+    def fileno(self):
+        '''The file descriptor of a mapped file, or None'''
+        if self._file is None:
+            return None
+        return self._file.fileno()
+
+    def acquire(self):
+        self._users += 1
+
+    def release(self):
+        self._users -= 1
+        if self._users == 0 and self._file is not None:
+            self.view.release()
+            if self._map is not None:
+                self._map.close()
+            self._file.close()
+            self._file = None
+
+
+class OutgoingMappedTransfer(_BaseOutgoingTransfer):
+    '''
+    An outgoing file transfer that writes a :class:`MappedSource` to
+    the socket directly, a chunk at a time as the socket is ready,
+    without copying the data into Python objects or Gio streams.
+
+    The `stats` property gives the `bytes` sent, the `seconds` taken
+    from the socket opening, the `throughput` in bytes per second and
+    whether `sendfile` was used.
+
+    Args:
+        source (:class:`MappedSource`), data to send
+    '''
+
+    def __init__(self, buddy, conn, source, filename, description, mime):
+        _BaseOutgoingTransfer.__init__(
+            self, buddy, conn, filename, description, mime)
+
+        self._source = source
+        self._source.acquire()
+        self._offset = 0
+        self._started = None
+        self._stats = dict(bytes=0, seconds=0., throughput=0.,
+                           sendfile=False)
+        self.connect('notify::state', self.__notify_state_cb)
+        self._create_channel(len(source))
+
+    def _send(self):
+        self._offset = getattr(self, 'initial_offset', 0)
+        self._started = time.time()
+        self._stats['sendfile'] = hasattr(os, 'sendfile') and \
+            self._source.fileno() is not None
+        self._socket.setblocking(False)
+        GLib.io_add_watch(
+            self._socket.fileno(), GLib.PRIORITY_LOW,
+            GLib.IOCondition.OUT | GLib.IOCondition.HUP |
+            GLib.IOCondition.ERR, self.__writable_cb)
+
+    def __writable_cb(self, fd, condition):
+        if condition & (GLib.IOCondition.HUP | GLib.IOCondition.ERR):
+            self._finish()
+            return False
+        count = min(MAPPED_CHUNK_SIZE, len(self._source) - self._offset)
+        try:
+            if self._stats['sendfile']:
+                sent = os.sendfile(fd, self._source.fileno(), self._offset,
+                                   count)
+            else:
+                sent = self._socket.send(
+                    self._source.view[self._offset:self._offset + count])
+        except BlockingIOError:
+            return True
+        except OSError as error:
+            self._finish()
+            self._transfer_error_cb(error)
+            return False
+        if sent == 0:
+            # The file shrank under us, or the peer went away: writing
+            # again would only spin
+            error = 'sent nothing at byte %d of %d' % (
+                self._offset, len(self._source))
+            self._finish()
+            self._transfer_error_cb(error)
+            return False
+        self._offset += sent
+        self._stats['bytes'] += sent
+        if self._offset < len(self._source):
+            return True
+        self._finish()
+        return False
+
+    def _finish(self):
+        if self._socket is not None:
+            self._socket.close()
+        if self._started is not None:
+            seconds = time.time() - self._started
+            self._stats['seconds'] = seconds
+            if seconds > 0:
+                self._stats['throughput'] = self._stats['bytes'] / seconds
+        if self._source is not None:
+            self._source.release()
+            self._source = None
+
+    def __notify_state_cb(self, file_transfer, pspec):
+        if self.props.state == FT_STATE_CANCELLED and \
+                self._source is not None and self._started is None:
+            # Never opened: let go of the source
+            self._source.release()
+            self._source = None
+
+    @property
+    def stats(self):
+        return dict(self._stats)
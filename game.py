@@ -14,6 +14,7 @@
 from gi.repository import Gtk, GdkPixbuf, GLib, Gdk
 import cairo
 
+from math import pi
 from random import uniform
 
 from gettext import gettext as _
@@ -27,18 +28,27 @@ except ImportError:
     GRID_CELL_SIZE = 0
 
 from sprites import Sprites, Sprite
+from board import Board
+from history import History
 
 
-# Grid dimensions must be even
+# Default grid dimensions (must be even)
 TEN = 10
 SIX = 6
 DOT_SIZE = 40
 
+# Dots and bars can be drawn directly with Cairo or rasterized from SVG
+RENDERER_CAIRO = 'cairo'
+RENDERER_SVG = 'svg'
+
 
 class Game():
 
-    def __init__(self, canvas, parent=None, colors=['#A0FFA0', '#FF8080']):
+    def __init__(self, canvas, parent=None, colors=['#A0FFA0', '#FF8080'],
+                 renderer=RENDERER_CAIRO, width=None, height=None,
+                 columns=TEN, rows=SIX):
         self._activity = parent
+        self.renderer = renderer
         self._colors = [colors[0]]
         self._colors.append(colors[1])
         self._colors.append('#FFFFFF')
@@ -63,15 +73,15 @@ class Game():
         self._canvas.connect("button-press-event", self._button_press_cb)
         self._canvas.connect("button-release-event", self._button_release_cb)
         self._canvas.connect("motion-notify-event", self._mouse_move_cb)
-        self._width = Gdk.Screen.width()
-        self._height = Gdk.Screen.height() - GRID_CELL_SIZE
-
-        scale = [self._width / (10 * DOT_SIZE * 1.2),
-                 self._height / (6 * DOT_SIZE * 1.2)]
-        self._scale = min(scale)
+        self._canvas.connect("size-allocate", self.__size_allocate_cb)
+        self._canvas.connect("notify::scale-factor", self.__scale_factor_cb)
+        if width is None:
+            width = Gdk.Screen.width()
+        if height is None:
+            height = Gdk.Screen.height() - GRID_CELL_SIZE
+        self._width = width
+        self._height = height
 
-        self._dot_size = int(DOT_SIZE * self._scale)
-        self._space = int(self._dot_size / 5.)
         self._orientation = 'horizontal'
         self.we_are_sharing = False
         self.playing_with_robot = False
@@ -79,46 +89,213 @@ class Game():
         self.last_spr = None
         self._timer = None
         self.roygbiv = False
+        self.author = ''  # who we are in a shared game
+        self.recorder = None  # a recorder.Recorder of the session
 
-        # Generate the sprites we'll need...
-        self._sprites = Sprites(self._canvas)
-        self._dots = []
-        for y in range(SIX):
-            for x in range(TEN):
-                xoffset = int((self._width - TEN * self._dot_size - \
-                                   (TEN - 1) * self._space) / 2.)
-                self._dots.append(
-                    Sprite(self._sprites,
-                           xoffset + x * (self._dot_size + self._space),
-                           y * (self._dot_size + self._space),
-                           self._new_dot(self._colors[2])))
-                self._dots[-1].type = 2  # not set
-                self._dots[-1].set_label_attributes(40)
-
-        self.vline = Sprite(self._sprites,
-                            int(self._width / 2.) - 1,
-                            0, self._line(vertical=True))
-        n = SIX / 2.
-        self.hline = Sprite(
-            self._sprites, 0,
-            int(self._dot_size * n + self._space * (n - 0.5)) - 1,
-            self._line(vertical=False))
-        self.hline.hide()
+        self._generate_grid(columns, rows)
 
         # and initialize a few variables we'll need.
         self._all_clear()
 
+    def _generate_grid(self, columns, rows):
+        ''' Size the dots to fit a grid of columns x rows and generate
+        the sprites we'll need. '''
+        # Checks for even dimensions
+        self._board = Board(columns, rows, self._orientation)
+        self._history = History(self._board.cells)
+        self._columns = columns
+        self._rows = rows
+        self._measure()
+
+        self._sprites = Sprites(self._canvas,
+                                cell_size=self._dot_size + self._space)
+        self._sprites.set_device_scale(self._canvas.get_scale_factor())
+        self._dots = []
+        self._dot_index = {}
+        for i in range(columns * rows):
+            self._dots.append(self._source_sprite(
+                self._dot_xy(i), self._dot_source(self._colors[2])))
+            self._dots[-1].type = 2  # not set
+            self._dots[-1].set_label_attributes(40)
+            self._dot_index[self._dots[-1]] = i
+
+        self.vline = self._source_sprite(self._vline_xy(),
+                                         self._line_source(vertical=True))
+        self.hline = self._source_sprite(self._hline_xy(),
+                                         self._line_source(vertical=False))
+        # The bars only change with the orientation
+        self.vline.set_static()
+        self.hline.set_static()
+        self.hline.hide()
+        self._canvas.queue_draw()
+
+    def _measure(self):
+        ''' Size the dots to fit the grid on the canvas '''
+        scale = [self._width / (self._columns * DOT_SIZE * 1.2),
+                 self._height / (self._rows * DOT_SIZE * 1.2)]
+        self._scale = min(scale)
+
+        self._dot_size = int(DOT_SIZE * self._scale)
+        self._space = int(self._dot_size / 5.)
+        self._xoffset = int((self._width - self._columns * self._dot_size -
+                             (self._columns - 1) * self._space) / 2.)
+
+    def _dot_xy(self, i):
+        x, y = self._dot_to_grid(i)
+        return (self._xoffset + x * (self._dot_size + self._space),
+                y * (self._dot_size + self._space))
+
+    def _vline_xy(self):
+        return (int(self._width / 2.) - 1, 0)
+
+    def _hline_xy(self):
+        n = self._rows / 2.
+        return (0, int(self._dot_size * n + self._space * (n - 0.5)) - 1)
+
+    def _source_sprite(self, pos, source):
+        ''' A sprite showing the image of a (key, factory) source '''
+        spr = Sprite(self._sprites, pos[0], pos[1],
+                     self._sprites.cached_image(*source))
+        spr.set_source(*source)
+        return spr
+
+    def __size_allocate_cb(self, canvas, allocation):
+        ''' Fit the grid to the new size of the canvas, re-rendering the
+        dots when the main loop is idle '''
+        if allocation.width < 2 or allocation.height < 2 or \
+                (allocation.width, allocation.height) == \
+                (self._width, self._height):
+            return
+        self._width = allocation.width
+        self._height = allocation.height
+        self._measure()
+        self._sprites.set_index_cell_size(self._dot_size + self._space)
+        for i, dot in enumerate(self._dots):
+            dot.move(self._dot_xy(i))
+            dot.set_source(*self._dot_source(self._colors[dot.type]),
+                           lazy=True)
+        self.vline.move(self._vline_xy())
+        self.vline.set_source(*self._line_source(vertical=True), lazy=True)
+        self.hline.move(self._hline_xy())
+        self.hline.set_source(*self._line_source(vertical=False), lazy=True)
+        self._canvas.queue_draw()
+
+    def __scale_factor_cb(self, canvas, pspec):
+        self._sprites.set_device_scale(canvas.get_scale_factor())
+
+    def _resize(self, columns, rows):
+        ''' Switch to a grid of a different size '''
+        if (columns, rows) != (self._columns, self._rows):
+            self._stop_increment_dot()
+            self.last_spr = None
+            self._generate_grid(columns, rows)
+
     def _all_clear(self):
         ''' Things to reinitialize when starting up a new game. '''
-        for dot in self._dots:
-            dot.type = 2
-            dot.set_shape(self._new_dot(self._colors[2]))
+        for i, dot in enumerate(self._dots):
+            self._set_dot(i, 2)
             dot.set_label('')
 
         self._set_orientation()
 
+    def _set_dot(self, i, color):
+        ''' Set the color of a dot in the board model and on screen '''
+        self._board.set(i, color)
+        self._show_dot(i, color)
+
+    def _show_dot(self, i, color):
+        ''' Set the color of a dot on screen '''
+        self._dots[i].type = color
+        self._dots[i].set_source(*self._dot_source(self._colors[color]))
+
+    def _set_dots(self, changes, author=''):
+        ''' Set the colors of a list of (dot, color) with one redraw,
+        recording them as a move by author '''
+        moves = []
+        self._sprites.begin_batch()
+        for i, color in changes:
+            moves.append((i, self._board.get(i), color))
+            self._set_dot(i, color)
+        self._sprites.end_batch()
+        self._record(moves, author)
+
+    def _write_dots(self, changes, record=True):
+        ''' Make a list of (dot, color) edits and return their times.
+        Unless record is False, they are recorded as one move. '''
+        clocks = []
+        moves = []
+        self._sprites.begin_batch()
+        for i, color in changes:
+            moves.append((i, self._board.get(i), color))
+            clocks.append(self._board.write(i, color, self.author))
+            self._show_dot(i, color)
+        self._sprites.end_batch()
+        if record:
+            self._record(moves, self.author)
+        elif self.recorder is not None:
+            self.recorder.edits(changes)
+        return clocks
+
+    def merge_dots(self, edits, mover=None):
+        ''' Apply a list of (dot, color, clock, author) edits from
+        sharers, keeping the latest edit of each dot.  The edits applied
+        are recorded as a move by mover.  Raise ValueError, before
+        changing anything, if an edit does not fit the board. '''
+        self._check_changes([(i, color) for i, color, clock, author
+                             in edits])
+        for i, color, clock, author in edits:
+            if not (isinstance(clock, int) and 0 <= clock < 1 << 32 and
+                    isinstance(author, str)):
+                raise ValueError('Bad time %r or author %r' % (clock, author))
+        moves = []
+        self._sprites.begin_batch()
+        for i, color, clock, author in edits:
+            old = self._board.get(i)
+            if self._board.merge(i, color, clock, author):
+                moves.append((i, old, color))
+                self._show_dot(i, color)
+        self._sprites.end_batch()
+        self._record(moves, mover)
+
+    def _record(self, moves, author):
+        ''' Add a move, a list of (dot, old, new), to the history and the
+        recording '''
+        self._history.record(moves, author)
+        if self.recorder is not None:
+            self.recorder.edits([(i, new) for i, old, new in moves])
+
+    def _reset_history(self):
+        ''' Start the history and a new game in the recording '''
+        self._history.reset(self._board.cells)
+        if self.recorder is not None:
+            self.recorder.new_game(*self.save_game())
+
+    def undo(self):
+        ''' Undo our latest move, and tell the other players '''
+        self._apply_history(
+            self._history.undo(self._board.cells, self.author))
+
+    def redo(self):
+        ''' Redo the move we undid last, and tell the other players '''
+        self._apply_history(
+            self._history.redo(self._board.cells, self.author))
+
+    def _apply_history(self, changes):
+        if not changes:
+            return
+        self._stop_increment_dot()
+        clocks = self._write_dots(changes, record=False)
+        self._test_game_over()
+        self._send_dots(changes, clocks)
+
+    def replay(self, steps=None):
+        ''' The colors of the dots after the first steps edits in the
+        history (by default, all of them) '''
+        return list(self._history.replay(steps))
+
     def _set_orientation(self):
         ''' Set bar and message for current orientation '''
+        self._board.set_orientation(self._orientation)
         if self._orientation == 'horizontal':
             self.hline.hide()
             self.vline.set_layer(1000)
@@ -144,46 +321,55 @@ class Game():
     def _initiating(self):
         return self._activity.initiating
 
-    def new_game(self, orientation='horizontal'):
-        ''' Start a new game. '''
+    def new_game(self, orientation='horizontal', columns=None, rows=None):
+        ''' Start a new game (optionally on a grid of a new size). '''
         self._orientation = orientation
+        self._resize(columns or self._columns, rows or self._rows)
 
         self._all_clear()
 
         # Fill in a few dots to start
-        for i in range(int(TEN * SIX / 2)):
-            n = int(uniform(0, TEN * SIX))
+        for i in range(int(self._columns * self._rows / 2)):
+            n = int(uniform(0, self._columns * self._rows))
             if self.roygbiv:
-                self._dots[n].type = int(uniform(2, len(self._colors)))
+                self._set_dot(n, int(uniform(2, len(self._colors))))
             else:
-                self._dots[n].type = int(uniform(0, 4))
-            self._dots[n].set_shape(self._new_dot(
-                    self._colors[self._dots[n].type]))
+                self._set_dot(n, int(uniform(0, 4)))
+        self._reset_history()
 
         if self.we_are_sharing:
             _logger.debug('sending a new game')
             self._parent.send_new_game()
 
-    def restore_game(self, dot_list, orientation):
-        ''' Restore a game from the Journal or share '''
-        for i, dot in enumerate(dot_list):
-            self._dots[i].type = dot
-            self._dots[i].set_shape(self._new_dot(
-                    self._colors[self._dots[i].type]))
+    def restore_game(self, dot_list, orientation, columns=TEN, rows=SIX,
+                     clock=0):
+        ''' Restore a game from the Journal or share.  clock is the
+        Lamport time of the sharer, so that our next edits are newer
+        than every edit the game already holds. '''
+        self._resize(columns, rows)
+        self._board.load(dot_list, clock=clock)
+        self._sprites.begin_batch()
+        for i, color in enumerate(self._board.cells):
+            self._show_dot(i, color)
+        self._sprites.end_batch()
         self._orientation = orientation
         self._set_orientation()
+        self._reset_history()
+
+    def clock(self):
+        ''' The Lamport time of the latest edit we have seen '''
+        return self._board.clock
 
     def save_game(self):
-        ''' Return dot list and orientation for saving to Journal or
-        sharing '''
-        dot_list = []
-        for dot in self._dots:
-            dot_list.append(dot.type)
-        return [dot_list, self._orientation]
+        ''' Return dot list, orientation and grid size for saving to
+        Journal or sharing '''
+        return [self._board.to_list(), self._orientation,
+                self._columns, self._rows]
 
     def _set_label(self, string):
         ''' Set the label in the toolbar or the window frame. '''
-        self._activity.status.set_label(string)
+        if self._activity is not None:
+            self._activity.status.set_label(string)
 
     def _button_press_cb(self, win, event):
         win.grab_focus()
@@ -204,24 +390,33 @@ class Game():
         self._stop_increment_dot()
 
     def _increment_dot_cb(self, spr):
-        spr.type += 1
+        color = spr.type + 1
         if self.roygbiv:
-            if spr.type >= len(self._colors):
-                spr.type = 2
+            if color >= len(self._colors):
+                color = 2
         else:
-            spr.type %= 4
-        spr.set_shape(self._new_dot(self._colors[spr.type]))
+            color %= 4
+        i = self._dot_index[spr]
+        changes = [(i, color)]
 
         if self.playing_with_robot:
-            self._robot_play(spr)
+            changes += self._robot_play(i, color)
 
+        clocks = self._write_dots(changes)
         self._test_game_over()
+        self._send_dots(changes, clocks)
 
+        return True  # call again
+
+    def _send_dots(self, changes, clocks):
+        ''' Share a list of (dot, color) edits made at clocks '''
         if self.we_are_sharing:
             _logger.debug('sending a click to the share')
-            self._parent.send_dot_click(self._dots.index(spr), spr.type)
-
-        return True  # call again
+            if len(changes) == 1:
+                self._parent.send_dot_click(changes[0][0], changes[0][1],
+                                            clocks[0])
+            else:
+                self._parent.send_dot_clicks(changes, clocks)
 
     def _increment_dot(self, spr):
         self._stop_increment_dot()
@@ -248,52 +443,64 @@ class Game():
             self.last_spr = spr
             self._increment_dot(spr)
 
-    def _robot_play(self, dot):
-        ''' Robot reflects dot clicked. '''
-        x, y = self._dot_to_grid(self._dots.index(dot))
-        if self._orientation == 'horizontal':
-            x = TEN - x - 1
-            i = self._grid_to_dot((x, y))
-            self._dots[i].type = dot.type
-            self._dots[i].set_shape(self._new_dot(self._colors[dot.type]))
-            if self.we_are_sharing:
-                _logger.debug('sending a robot click to the share')
-                self._parent.send_dot_click(i, dot.type)
-        elif self._orientation == 'vertical':
-            y = SIX - y - 1
-            i = self._grid_to_dot((x, y))
-            self._dots[i].type = dot.type
-            self._dots[i].set_shape(self._new_dot(self._colors[dot.type]))
-            if self.we_are_sharing:
-                _logger.debug('sending a robot click to the share')
-                self._parent.send_dot_click(i, dot.type)
-        else:
-            x = TEN - x - 1
-            i = self._grid_to_dot((x, y))
-            self._dots[i].type = dot.type
-            self._dots[i].set_shape(self._new_dot(self._colors[dot.type]))
-            if self.we_are_sharing:
-                _logger.debug('sending a robot click to the share')
-                self._parent.send_dot_click(i, dot.type)
-            y = SIX - y - 1
-            i = self._grid_to_dot((x, y))
-            self._dots[i].type = dot.type
-            self._dots[i].set_shape(self._new_dot(self._colors[dot.type]))
-            if self.we_are_sharing:
-                _logger.debug('sending a robot click to the share')
-                self._parent.send_dot_click(i, dot.type)
-            x = TEN - x - 1
-            i = self._grid_to_dot((x, y))
-            self._dots[i].type = dot.type
-            self._dots[i].set_shape(self._new_dot(self._colors[dot.type]))
-            if self.we_are_sharing:
-                _logger.debug('sending a robot click to the share')
-                self._parent.send_dot_click(i, dot.type)
-
-    def remote_button_press(self, dot, color):
+    def _robot_play(self, i, color):
+        ''' Robot reflects dot clicked: return the (dot, color) changes
+        for every mirror of dot i. '''
+        return [(j, color) for j in self._board.mirrors(i)]
+
+    def _check_changes(self, changes):
+        ''' Raise ValueError unless every (dot, color) fits the board '''
+        for i, color in changes:
+            if not (isinstance(i, int) and isinstance(color, int) and
+                    0 <= i < len(self._dots) and
+                    0 <= color < len(self._colors)):
+                raise ValueError('No dot %r of color %r' % (i, color))
+
+    def remote_button_press(self, dot, color, clock=None, author=''):
         ''' Receive a button press from a sharer '''
-        self._dots[dot].type = color
-        self._dots[dot].set_shape(self._new_dot(self._colors[color]))
+        self._check_changes([(dot, color)])
+        if clock is None:  # from an older sharer
+            self._set_dots([(dot, color)], author)
+        else:
+            self.merge_dots([(dot, color, clock, author)], author)
+
+    def remote_button_presses(self, changes, clocks=None, author=''):
+        ''' Receive a batch of (dot, color) from a sharer '''
+        self._check_changes(changes)
+        if clocks is None:
+            self._set_dots(changes, author)
+        else:
+            self.merge_dots([(i, color, clock, author) for (i, color), clock
+                             in zip(changes, clocks)], author)
+
+    def checksums(self):
+        ''' Return the size of the board, a checksum of the board and a
+        checksum of each row '''
+        return [self._columns, self._rows, self._board.checksum(),
+                self._board.row_checksums()]
+
+    def rows_state(self, rows):
+        ''' Return [row, colors, clocks, authors] for each row '''
+        return [[y] + self._board.row_state(y) for y in rows]
+
+    def merge_rows(self, rows):
+        ''' Merge the output of rows_state from a sharer.  Raise
+        ValueError, before changing anything, if a row does not fit the
+        board. '''
+        edits = []
+        for row in rows:
+            try:
+                y, colors, clocks, authors = row
+                lengths = set([len(colors), len(clocks), len(authors)])
+            except (TypeError, ValueError):
+                raise ValueError('Bad row %r' % (row,))
+            if not isinstance(y, int) or not 0 <= y < self._rows or \
+                    lengths != set([self._columns]):
+                raise ValueError('Row %r does not fit the board' % (y,))
+            for x in range(self._columns):
+                edits.append((y * self._columns + x, colors[x], clocks[x],
+                              authors[x]))
+        self.merge_dots(edits)
 
     def set_sharing(self, share=True):
         _logger.debug('enabling sharing')
@@ -305,49 +512,22 @@ class Game():
 
     def _test_game_over(self):
         ''' Check to see if game is over '''
-        if self._orientation == 'horizontal':
-            for y in range(SIX):
-                for x in range(SIX):
-                    if self._dots[y * TEN + x].type != \
-                            self._dots[y * TEN + TEN - x - 1].type:
-                        self._set_label(_('keep trying'))
-                        return False
-            self._set_label(_('good work'))
-            self._smile()
-            return True
-        if self._orientation == 'vertical':
-            for y in range(int(SIX / 2)):
-                for x in range(TEN):
-                    if self._dots[y * TEN + x].type != \
-                            self._dots[(SIX - y - 1) * TEN + x].type:
-                        self._set_label(_('keep trying'))
-                        return False
-            self._set_label(_('good work'))
-        else:
-            for y in range(SIX):
-                for x in range(SIX):
-                    if self._dots[y * TEN + x].type != \
-                            self._dots[y * TEN + TEN - x - 1].type:
-                        self._set_label(_('keep trying'))
-                        return False
-            for y in range(int(SIX / 2)):
-                for x in range(TEN):
-                    if self._dots[y * TEN + x].type != \
-                            self._dots[(SIX - y - 1) * TEN + x].type:
-                        self._set_label(_('keep trying'))
-                        return False
-            self._set_label(_('good work'))
+        if not self._board.is_symmetric():
+            self._set_label(_('keep trying'))
+            return False
+        self._set_label(_('good work'))
         self._smile()
         return True
+
     def __draw_cb(self,canvas,cr):
         self._sprites.redraw_sprites(cr=cr)
     def _grid_to_dot(self, pos):
         ''' calculate the dot index from a column and row in the grid '''
-        return pos[0] + pos[1] * TEN
+        return pos[0] + pos[1] * self._columns
 
     def _dot_to_grid(self, dot):
         ''' calculate the grid column and row for a dot '''
-        return [dot % TEN, int(dot / TEN)]
+        return [dot % self._columns, int(dot / self._columns)]
 
     def _expose_cb(self, win, event):
         self.do_expose_event(event)
@@ -365,46 +545,50 @@ class Game():
     def _destroy_cb(self, win, event):
         Gtk.main_quit()
 
-    def _new_dot(self, color):
+    def _dot_source(self, color):
+        ''' The cache key and factory of the image of a dot of a color '''
+        size = self._dot_size
+        return (('dot', color, size, self.renderer),
+                lambda scale: self._new_dot(color, size, scale))
+
+    def _new_dot(self, color, size, scale=1):
         ''' generate a dot of a color color '''
-        self._dot_cache = {}
-        if not color in self._dot_cache:
-            self._stroke = color
-            self._fill = color
-            self._svg_width = self._dot_size
-            self._svg_height = self._dot_size
-            pixbuf = svg_str_to_pixbuf(
-                self._header() + \
-                self._circle(self._dot_size / 2., self._dot_size / 2.,
-                             self._dot_size / 2.) + \
-                self._footer())
-
-            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32,
-                                         self._svg_width, self._svg_height)
-            context = cairo.Context(surface)
-            Gdk.cairo_set_source_pixbuf(context, pixbuf, 0, 0)
-            context.rectangle(0, 0, self._svg_width, self._svg_height)
-            context.fill()
-            self._dot_cache[color] = surface
-
-        return self._dot_cache[color]
-
-    def _line(self, vertical=True):
-        ''' Generate a center line '''
+        if self.renderer == RENDERER_SVG:
+            return self._svg_dot(color, size, scale)
+        return cairo_dot(color, size, scale)
+
+    def _svg_dot(self, color, size, scale=1):
+        ''' rasterize a dot from SVG (for themed assets) '''
+        self._stroke = color
+        self._fill = color
+        self._svg_width = int(size * scale)
+        self._svg_height = int(size * scale)
+        pixbuf = svg_str_to_pixbuf(
+            self._header() + \
+            self._circle(size * scale / 2., size * scale / 2.,
+                         size * scale / 2.) + \
+            self._footer())
+        return pixbuf_to_surface(pixbuf, scale)
+
+    def _line_source(self, vertical=True):
+        ''' The cache key and factory of the image of a center line '''
         if vertical:
-            self._svg_width = 3
-            self._svg_height = self._height
-            return svg_str_to_pixbuf(
-                self._header() + \
-                self._rect(3, self._height, 0, 0) + \
-                self._footer())
+            width, height = 3, self._height
         else:
-            self._svg_width = self._width
-            self._svg_height = 3
-            return svg_str_to_pixbuf(
-                self._header() + \
-                self._rect(self._width, 3, 0, 0) + \
-                self._footer())
+            width, height = self._width, 3
+        return (('line', width, height, self.renderer),
+                lambda scale: self._line(width, height, scale))
+
+    def _line(self, width, height, scale=1):
+        ''' Generate a center line '''
+        if self.renderer != RENDERER_SVG:
+            return cairo_rect(width, height, scale=scale)
+        self._svg_width = int(width * scale)
+        self._svg_height = int(height * scale)
+        return pixbuf_to_surface(svg_str_to_pixbuf(
+            self._header() + \
+            self._rect(width * scale, height * scale, 0, 0) + \
+            self._footer()), scale)
 
     def _header(self):
         return '<svg\n' + 'xmlns:svg="http://www.w3.org/2000/svg"\n' + \
@@ -433,6 +617,54 @@ class Game():
         return '</svg>\n'
 
 
+def hex_to_rgb(color):
+    ''' Convert '#RRGGBB' to a tuple of floats '''
+    return (int(color[1:3], 16) / 255.,
+            int(color[3:5], 16) / 255.,
+            int(color[5:7], 16) / 255.)
+
+
+def _scaled_surface(width, height, scale):
+    ''' A surface of width x height logical pixels at a device scale '''
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, int(width * scale),
+                                 int(height * scale))
+    surface.set_device_scale(scale, scale)
+    return surface
+
+
+def cairo_dot(color, size, scale=1):
+    ''' Draw a dot of a color directly onto a new Cairo surface '''
+    surface = _scaled_surface(size, size, scale)
+    context = cairo.Context(surface)
+    context.set_source_rgb(*hex_to_rgb(color))
+    context.arc(size / 2., size / 2., size / 2. - 0.5, 0, 2 * pi)
+    context.fill_preserve()
+    context.set_line_width(1)
+    context.stroke()
+    return surface
+
+
+def cairo_rect(width, height, color='#000000', scale=1):
+    ''' Draw a solid bar directly onto a new Cairo surface '''
+    surface = _scaled_surface(width, height, scale)
+    context = cairo.Context(surface)
+    context.set_source_rgb(*hex_to_rgb(color))
+    context.rectangle(0, 0, width, height)
+    context.fill()
+    return surface
+
+
+def pixbuf_to_surface(pixbuf, scale=1):
+    ''' Copy a pixbuf rendered at a device scale onto a Cairo surface '''
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, pixbuf.get_width(),
+                                 pixbuf.get_height())
+    context = cairo.Context(surface)
+    Gdk.cairo_set_source_pixbuf(context, pixbuf, 0, 0)
+    context.paint()
+    surface.set_device_scale(scale, scale)
+    return surface
+
+
 def svg_str_to_pixbuf(svg_string):
     try:
         pl = GdkPixbuf.PixbufLoader.new_with_type('svg')
@@ -0,0 +1,168 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+''' Drive a Game without a display or a Sugar session.
+
+The game draws onto an offscreen cairo.ImageSurface through a fake
+canvas that records the regions the sprites invalidate, and pointer
+events are delivered straight to the game's handlers:
+
+    harness = HeadlessGame(columns=10, rows=6)
+    harness.game.new_game('vertical')
+    harness.click(*harness.dot_center(0))
+    harness.paint()
+    harness.surface.write_to_png('board.png')
+'''
+
+import gi
+gi.require_version('Gtk', '3.0')
+import cairo
+
+from game import Game
+
+WIDTH = 1200
+HEIGHT = 900
+
+
+class FakeCanvas():
+    ''' Just enough of a Gtk.DrawingArea for Game to run offscreen '''
+
+    def __init__(self, width=WIDTH, height=HEIGHT):
+        self.width = width
+        self.height = height
+        self.scale_factor = 1
+        self.damage = []
+        self.handlers = {}
+
+    def add_events(self, mask):
+        pass
+
+    def connect(self, signal, callback, *args):
+        self.handlers.setdefault(signal, []).append((callback, args))
+
+    def emit(self, signal, *args):
+        for callback, extra in self.handlers.get(signal, []):
+            callback(self, *(args + extra))
+
+    def queue_draw(self):
+        self.damage = [(0, 0, self.width, self.height)]
+
+    def queue_draw_area(self, x, y, width, height):
+        self.damage.append((x, y, width, height))
+
+    def grab_focus(self):
+        pass
+
+    def get_window(self):
+        return None
+
+    def get_allocated_width(self):
+        return self.width
+
+    def get_allocated_height(self):
+        return self.height
+
+    def get_scale_factor(self):
+        return self.scale_factor
+
+
+class FakeEvent():
+    ''' A pointer event at (x, y) '''
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def get_coords(self):
+        return (self.x, self.y)
+
+
+class FakeAllocation():
+    ''' The size of the canvas '''
+
+    def __init__(self, width, height):
+        self.x = 0
+        self.y = 0
+        self.width = width
+        self.height = height
+
+
+class HeadlessGame():
+    ''' A Game drawing onto an offscreen surface '''
+
+    def __init__(self, width=WIDTH, height=HEIGHT, **kwargs):
+        self.canvas = FakeCanvas(width, height)
+        self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        self.game = Game(self.canvas, width=width, height=height, **kwargs)
+
+    def resize(self, width, height):
+        ''' Give the canvas a new size, as a window resize would '''
+        self.canvas.width = width
+        self.canvas.height = height
+        self._new_surface()
+        self.canvas.emit('size-allocate', FakeAllocation(width, height))
+
+    def set_scale_factor(self, scale):
+        ''' Move the canvas to a screen with another scale factor '''
+        self.canvas.scale_factor = scale
+        self._new_surface()
+        self.canvas.emit('notify::scale-factor', None)
+
+    def _new_surface(self):
+        scale = self.canvas.scale_factor
+        self.surface = cairo.ImageSurface(
+            cairo.FORMAT_ARGB32, self.canvas.width * scale,
+            self.canvas.height * scale)
+        self.surface.set_device_scale(scale, scale)
+
+    def restore_game(self, replay, when):
+        ''' Show a recorded session (a recorder.Replay) as it was at
+        when, and paint it.  Return False before the first game. '''
+        if not replay.restore(self.game, when):
+            return False
+        self.paint()
+        return True
+
+    def dot_center(self, i):
+        ''' The position of the middle of dot i '''
+        x, y, width, height = self.game._dots[i].rect
+        return (x + width // 2, y + height // 2)
+
+    def press(self, x, y):
+        self.canvas.emit('button-press-event', FakeEvent(x, y))
+
+    def move(self, x, y):
+        self.canvas.emit('motion-notify-event', FakeEvent(x, y))
+
+    def release(self, x, y):
+        self.canvas.emit('button-release-event', FakeEvent(x, y))
+
+    def click(self, x, y):
+        self.press(x, y)
+        self.release(x, y)
+
+    def paint(self):
+        ''' Redraw the damaged regions, as GTK would on the next frame.
+        Return the number of regions. '''
+        damage = self.canvas.damage
+        self.canvas.damage = []
+        if not damage:
+            return 0
+        cr = cairo.Context(self.surface)
+        for x, y, width, height in damage:
+            cr.rectangle(x, y, width, height)
+        cr.clip()
+        self.canvas.emit('draw', cr)
+        return len(damage)
+
+    def paint_all(self):
+        ''' Redraw the whole canvas '''
+        self.canvas.queue_draw()
+        return self.paint()
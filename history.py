@@ -0,0 +1,211 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+''' A fixed-size history of the edits made to the board, for undo,
+redo and replay.  It does not need GTK.
+
+Every edit of a cell is packed into one 32-bit record, kept in a ring
+buffer:
+
+    bits  0-15  cell
+    bits 16-19  old color
+    bits 20-23  new color
+    bits 24-27  author (an index into a table of authors; the last index
+                is shared by any authors past the end of the table)
+    bit     28  first edit of a move (a click and the robot's replies)
+    bit     29  the move has been undone
+    bit     30  the edit undoes or redoes a move
+
+When the buffer is full the oldest edit is applied to a snapshot of
+the board, so the snapshot followed by the edits still in the buffer
+always replays to the current board.  A move of more edits than the
+buffer holds (such as repairing a large board) goes straight into the
+snapshot, and cannot be undone.  Nor can the moves of the authors
+sharing the last index, who cannot be told apart.
+'''
+
+from array import array
+from collections import deque
+
+# Edits kept in the history
+HISTORY_SIZE = 4096
+
+MAX_CELLS = 1 << 16
+MAX_AUTHORS = 16
+
+_SHARED = MAX_AUTHORS - 1
+
+_GROUP = 1 << 28
+_UNDONE = 1 << 29
+_REVERT = 1 << 30
+
+
+def pack_edit(cell, old, new, author=0, flags=0):
+    return cell | old << 16 | new << 20 | author << 24 | flags
+
+
+def unpack_edit(record):
+    ''' Return the (cell, old, new, author) of a record '''
+    return (record & 0xFFFF, record >> 16 & 0xF, record >> 20 & 0xF,
+            record >> 24 & 0xF)
+
+
+class History():
+    ''' The edits made to a board since it was reset '''
+
+    def __init__(self, cells, capacity=HISTORY_SIZE):
+        self._records = array('I', [0]) * capacity
+        self._capacity = capacity
+        self._authors = {}  # author -> index
+        self.reset(cells)
+
+    def reset(self, cells):
+        ''' Forget every edit and start again from cells '''
+        if len(cells) > MAX_CELLS:
+            raise ValueError('Too many cells for the history (%d)' %
+                             len(cells))
+        self._snapshot = bytearray(cells)
+        self._first = 0  # number of the oldest edit kept
+        self._count = 0
+        self._moves = {}  # author index -> numbers of moves to undo
+        self._redo = []  # numbers of the undone moves, latest last
+
+    def __len__(self):
+        return self._count
+
+    def _author(self, author):
+        ''' The index of an author; past the end of the table, the
+        shared index, which is never added to the table '''
+        index = self._authors.get(author)
+        if index is None:
+            if len(self._authors) == _SHARED:
+                return _SHARED
+            index = self._authors[author] = len(self._authors)
+        return index
+
+    def _get(self, n):
+        return self._records[n % self._capacity]
+
+    def _append(self, record):
+        if self._count == self._capacity:
+            # Roll the oldest edit into the snapshot
+            cell, old, new, author = unpack_edit(self._get(self._first))
+            self._snapshot[cell] = new
+            self._first += 1
+            self._count -= 1
+        self._records[(self._first + self._count) % self._capacity] = record
+        self._count += 1
+
+    def record(self, edits, author=''):
+        ''' Record a move: a list of (cell, old, new) edits by author '''
+        if not edits:
+            return
+        if len(edits) > self._capacity:
+            # It would push every edit out, its own first one included
+            cells = self.replay()
+            for cell, old, new in edits:
+                cells[cell] = new
+            self.reset(cells)
+            return
+        index = self._author(author)
+        start = self._first + self._count
+        flags = _GROUP
+        for cell, old, new in edits:
+            self._append(pack_edit(cell, old, new, index, flags))
+            flags = 0
+        if index != _SHARED:
+            # A move by a shared index is kept for replay only
+            moves = self._moves.setdefault(index, deque())
+            moves.append(start)
+            while moves[0] < self._first:
+                moves.popleft()
+        # A new move by the author cannot be followed by a redo
+        self._redo = [n for n in self._redo if n >= self._first and
+                      unpack_edit(self._get(n))[3] != index]
+
+    def _move(self, start):
+        ''' The numbers of the edits of the move starting at start '''
+        end = start + 1
+        while end < self._first + self._count and \
+                not self._get(end) & _GROUP:
+            end += 1
+        return range(start, end)
+
+    def _last_move(self, author):
+        ''' The number of the latest move by author that can be undone '''
+        moves = self._moves.get(self._authors.get(author))
+        if moves and moves[-1] >= self._first:
+            return moves[-1]
+        return None
+
+    def can_undo(self, author=''):
+        return self._last_move(author) is not None
+
+    def _last_undone(self, author):
+        ''' The number of the latest move by author that was undone '''
+        index = self._authors.get(author)
+        for n in reversed(self._redo):
+            if n >= self._first and self._get(n) & _UNDONE and \
+                    unpack_edit(self._get(n))[3] == index:
+                return n
+        return None
+
+    def can_redo(self, author=''):
+        return self._last_undone(author) is not None
+
+    def undo(self, cells, author=''):
+        ''' Undo the latest move by author.  Cells someone has changed
+        since are left alone.  Return the (cell, color) to write. '''
+        start = self._last_move(author)
+        if start is None:
+            return []
+        self._records[start % self._capacity] |= _UNDONE
+        self._moves[self._authors[author]].pop()
+        self._redo.append(start)
+        return self._revert(cells, author, [
+            (cell, new, old) for cell, old, new, index in
+            [unpack_edit(self._get(n)) for n in reversed(self._move(start))]])
+
+    def redo(self, cells, author=''):
+        ''' Redo the latest move undone by author.  Return the (cell,
+        color) to write. '''
+        start = self._last_undone(author)
+        if start is None:
+            return []
+        self._redo.remove(start)
+        self._records[start % self._capacity] &= ~_UNDONE
+        self._moves[unpack_edit(self._get(start))[3]].append(start)
+        return self._revert(cells, author, [
+            unpack_edit(self._get(n))[:3] for n in self._move(start)])
+
+    def _revert(self, cells, author, edits):
+        ''' Record the edits undoing or redoing a move, skipping cells
+        that no longer have the color expected; return (cell, color) '''
+        index = self._author(author)
+        changes = []
+        flags = _GROUP | _REVERT
+        for cell, expected, color in edits:
+            if cells[cell] != expected:
+                continue
+            self._append(pack_edit(cell, expected, color, index, flags))
+            flags = _REVERT
+            changes.append((cell, color))
+        return changes
+
+    def replay(self, steps=None):
+        ''' The cells of the board after the oldest steps edits kept
+        (by default, all of them) '''
+        cells = bytearray(self._snapshot)
+        if steps is None:
+            steps = self._count
+        for n in range(self._first, self._first + min(steps, self._count)):
+            record = self._get(n)
+            cells[record & 0xFFFF] = record >> 20 & 0xF
+        return cells
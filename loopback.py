@@ -0,0 +1,191 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+''' An in-process transport for CollabWrapper.
+
+Every participant of a LoopbackHub gets a transport that stands in for
+the Telepathy shared activity, so several CollabWrappers can share an
+activity inside one process, without a presence service or D-Bus:
+
+    hub = LoopbackHub()
+    leader = CollabWrapper(activity_a, transport=hub.transport('a'))
+    joiner = CollabWrapper(activity_b, transport=hub.transport('b'))
+    leader.setup()
+    joiner.setup()
+    hub.run()
+
+Messages are encoded as JSON, as they would be on the text channel,
+and delivered to the other participants from the GLib main loop (or
+by calling `pump` or `run`).  The hub counts what it delivers and how
+long each message waited.
+'''
+
+import json
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from gi.repository import GLib
+
+import logging
+_logger = logging.getLogger('loopback')
+
+
+class LoopbackBuddy():
+    ''' A participant, as seen by the others '''
+
+    def __init__(self, nick, key):
+        self.props = SimpleNamespace(nick=nick, key=key)
+
+
+class LoopbackHub():
+    ''' A shared activity that lives in one process '''
+
+    def __init__(self):
+        self._members = []
+        self._pending = deque()  # (sender, text, time posted)
+        self._pump_id = None
+        self._stats = dict(posted=0, delivered=0, bytes=0,
+                           total_latency=0., max_latency=0.)
+
+    def transport(self, nick):
+        ''' A new participant, to give to CollabWrapper '''
+        return LoopbackTransport(self, nick, 'loopback-%d' % id(self))
+
+    def join(self, member):
+        ''' Add a member; return True if it is the first (the leader) '''
+        leader = not self._members
+        for other in self._members:
+            other.emit('buddy-joined', member.buddy)
+        self._members.append(member)
+        return leader
+
+    def leave(self, member):
+        if member not in self._members:
+            return
+        self._members.remove(member)
+        for other in self._members:
+            other.emit('buddy-left', member.buddy)
+
+    def buddies(self, member):
+        ''' Everyone but member '''
+        return [other.buddy for other in self._members if other != member]
+
+    def broadcast(self, sender, text):
+        ''' Queue text for every member but the sender '''
+        self._stats['posted'] += 1
+        self._pending.append((sender, text, time.time()))
+        if self._pump_id is None:
+            self._pump_id = GLib.idle_add(self.pump)
+
+    def pump(self):
+        ''' Deliver the messages posted so far; return how many '''
+        if self._pump_id is not None:
+            GLib.source_remove(self._pump_id)
+            self._pump_id = None
+        count = len(self._pending)
+        for i in range(count):
+            sender, text, posted = self._pending.popleft()
+            for member in list(self._members):
+                if member != sender:
+                    member.receive(sender.buddy, text)
+                    latency = time.time() - posted
+                    self._stats['delivered'] += 1
+                    self._stats['bytes'] += len(text)
+                    self._stats['total_latency'] += latency
+                    self._stats['max_latency'] = max(
+                        latency, self._stats['max_latency'])
+        return count
+
+    def run(self):
+        ''' Deliver messages until there are none left '''
+        while self.pump():
+            pass
+
+    @property
+    def stats(self):
+        '''
+        A dict of counters: messages `posted` and `delivered` (once per
+        recipient), `bytes` delivered, and the `mean_latency` and
+        `max_latency` in seconds from posting to delivery.
+        '''
+        stats = dict(self._stats)
+        stats['mean_latency'] = \
+            stats['total_latency'] / max(stats['delivered'], 1)
+        return stats
+
+
+class LoopbackTransport():
+    ''' One participant of a LoopbackHub.  It plays the part of the
+    shared activity for CollabWrapper. '''
+
+    def __init__(self, hub, nick, prefix):
+        self._hub = hub
+        self.buddy = LoopbackBuddy(nick, '%s-%s' % (prefix, nick))
+        self._handlers = {}
+        self._channel = None
+
+    def get_owner(self):
+        return self.buddy
+
+    def join(self):
+        ''' Join the hub; return True if we are the leader '''
+        return self._hub.join(self)
+
+    def leave(self):
+        self._hub.leave(self)
+
+    def connect(self, signal, callback, *args):
+        self._handlers.setdefault(signal, []).append((callback, args))
+
+    def emit(self, signal, *args):
+        for callback, extra in self._handlers.get(signal, []):
+            callback(self, *(args + extra))
+
+    def get_joined_buddies(self):
+        return self._hub.buddies(self)
+
+    def text_channel(self):
+        if self._channel is None:
+            self._channel = LoopbackChannel(self)
+        return self._channel
+
+    def send(self, text):
+        self._hub.broadcast(self, text)
+
+    def receive(self, buddy, text):
+        if self._channel is not None:
+            self._channel.receive(buddy, text)
+
+
+class LoopbackChannel():
+    ''' The text channel of a LoopbackTransport '''
+
+    def __init__(self, transport):
+        self._transport = transport
+        self._callback = None
+
+    def post(self, msg):
+        if msg is not None:
+            _logger.debug('post')
+            self._transport.send(json.dumps(msg))
+
+    def set_received_callback(self, callback):
+        self._callback = callback
+
+    def receive(self, buddy, text):
+        if self._callback is not None:
+            self._callback(buddy, json.loads(text))
+
+    def forget_buddy(self, buddy=None):
+        pass
+
+    def close(self):
+        self._transport.leave()
@@ -0,0 +1,241 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+''' Record a session of play to a file and replay it.  It does not
+need GTK.
+
+A recording is a header followed by records, appended as the game is
+played:
+
+    header: 'RFLS', version, start time (double)
+    record: type, seconds since the start (double), length (uint32),
+            then length bytes
+
+    G  a new (or restored) game: orientation, columns (uint16),
+       rows (uint16), cells packed two to a byte
+    S  a snapshot of the board, in the same form as G
+    E  edits: count (uint16), count x (cell (uint16), color)
+
+A snapshot is written after every SNAPSHOT_INTERVAL records, so a
+replay can seek to any time by finding the last game or snapshot
+before it (a binary search) and applying the few edits that follow.
+
+A recorder opened on an existing recording appends to it, leaving out
+the time between the sessions.
+'''
+
+import os
+import struct
+import time
+from bisect import bisect_right
+
+from board import Board, ORIENTATIONS
+from codec import pack_cells, unpack_cells
+
+MAGIC = b'RFLS'
+RECORDING_VERSION = 1
+RECORDING_MIME = 'application/x-reflection-session'
+
+# Records between snapshots of the board
+SNAPSHOT_INTERVAL = 256
+
+GAME = b'G'
+SNAPSHOT = b'S'
+EDITS = b'E'
+
+_HEADER = struct.Struct('>4sBd')
+_RECORD = struct.Struct('>cdI')
+_BOARD = struct.Struct('>BHH')
+_COUNT = struct.Struct('>H')
+_EDIT = struct.Struct('>HB')
+
+
+def _pack_board(board):
+    return _BOARD.pack(ORIENTATIONS.index(board.orientation),
+                       board.columns, board.rows) + pack_cells(board.cells)
+
+
+def _index(data):
+    ''' Check the header of a recording and find its complete records.
+    Return the start time, a list of (kind, when, start, end) of each
+    record (start and end of its payload) and the length of data they
+    take; a record cut short while writing is left out. '''
+    if len(data) < _HEADER.size:
+        raise ValueError('Not a recording')
+    magic, version, start = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != RECORDING_VERSION:
+        raise ValueError('Unsupported recording (%r, %d)' % (magic, version))
+    records = []
+    offset = _HEADER.size
+    while offset + _RECORD.size <= len(data):
+        kind, when, length = _RECORD.unpack_from(data, offset)
+        if offset + _RECORD.size + length > len(data):
+            break
+        offset += _RECORD.size
+        records.append((kind, when, offset, offset + length))
+        offset += length
+    return start, records, offset
+
+
+def _unpack_board(payload):
+    orientation, columns, rows = _BOARD.unpack_from(payload)
+    board = Board(columns, rows, ORIENTATIONS[orientation])
+    board.load(unpack_cells(payload[_BOARD.size:], columns * rows))
+    return board
+
+
+class Recorder():
+    ''' Append the moves of a session to a file '''
+
+    def __init__(self, path, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.path = path
+        self.records = 0
+        self._snapshot_interval = snapshot_interval
+        self._since_snapshot = 0
+        self._board = None
+        self._start = time.time()
+        records = None
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            try:
+                start, records, end = _index(data)
+            except ValueError:
+                records = None
+        if records is None:
+            self._file = open(path, 'wb')
+            self._file.write(_HEADER.pack(MAGIC, RECORDING_VERSION,
+                                          self._start))
+            return
+        # Carry on from the last record
+        self._file = open(path, 'r+b')
+        self._file.truncate(end)
+        self._file.seek(end)
+        self.records = len(records)
+        if records:
+            self._start -= records[-1][1]
+
+    def _write(self, kind, payload, when=None):
+        if when is None:
+            when = time.time()
+        self._file.write(_RECORD.pack(kind, when - self._start, len(payload)))
+        self._file.write(payload)
+        self.records += 1
+
+    def new_game(self, dot_list, orientation, columns, rows, when=None):
+        ''' Record the start of a game (or a change of orientation or
+        size, which start a new one) '''
+        self._board = Board(columns, rows, orientation)
+        self._board.load(dot_list)
+        self._write(GAME, _pack_board(self._board), when)
+        self._since_snapshot = 0
+        self._file.flush()
+
+    def edits(self, changes, when=None):
+        ''' Record a list of (dot, color) made by any player '''
+        if self._board is None or not changes:
+            return
+        payload = bytearray(_COUNT.pack(len(changes)))
+        for i, color in changes:
+            payload += _EDIT.pack(i, color)
+            self._board.set(i, color)
+        self._write(EDITS, bytes(payload), when)
+        self._since_snapshot += 1
+        if self._since_snapshot >= self._snapshot_interval:
+            self._write(SNAPSHOT, _pack_board(self._board), when)
+            self._since_snapshot = 0
+            self._file.flush()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class Replay():
+    ''' A recorded session, read back for replay '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._data = f.read()
+        self.start, records, end = _index(self._data)
+
+        self._kinds = []
+        self._times = []
+        self._offsets = []  # of the payload of each record
+        self._anchors = []  # records holding a whole board
+        for kind, when, start, end in records:
+            if kind in (GAME, SNAPSHOT):
+                self._anchors.append(len(self._kinds))
+            self._kinds.append(kind)
+            self._times.append(when)
+            self._offsets.append((start, end))
+
+    def __len__(self):
+        return len(self._kinds)
+
+    @property
+    def duration(self):
+        ''' Seconds from the start to the last record '''
+        return self._times[-1] if self._times else 0.
+
+    def _payload(self, n):
+        start, end = self._offsets[n]
+        return self._data[start:end]
+
+    def seek(self, when):
+        ''' The board as it was at when (seconds since the start), or
+        None before the first game '''
+        end = bisect_right(self._times, when)
+        anchor = bisect_right(self._anchors, end - 1) - 1
+        if anchor < 0:
+            return None
+        n = self._anchors[anchor]
+        board = _unpack_board(self._payload(n))
+        for n in range(n + 1, end):
+            payload = self._payload(n)
+            count, = _COUNT.unpack_from(payload)
+            for j in range(count):
+                i, color = _EDIT.unpack_from(payload,
+                                             _COUNT.size + j * _EDIT.size)
+                board.set(i, color)
+        return board
+
+    def state(self, when):
+        ''' The game at when, as [dot_list, orientation, columns, rows]
+        for Game.restore_game '''
+        board = self.seek(when)
+        if board is None:
+            return None
+        return [board.to_list(), board.orientation, board.columns,
+                board.rows]
+
+    def restore(self, game, when):
+        ''' Show the game at when on a game.Game (such as the game of a
+        headless.HeadlessGame).  Return False before the first game. '''
+        state = self.state(when)
+        if state is None:
+            return False
+        game.restore_game(*state)
+        return True
+
+    def frames(self, step, speed=1.):
+        ''' Yield (when, board) every step seconds of replay, playing
+        the session speed times faster than it was recorded '''
+        when = 0.
+        while True:
+            board = self.seek(when)
+            if board is not None:
+                yield when, board
+            if when >= self.duration:
+                return
+            when = min(when + step * speed, self.duration)
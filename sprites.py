@@ -466,19 +466,217 @@ class Sprite:
 import gi
 gi.require_version('PangoCairo', '1.0')
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, GdkPixbuf, Gdk
+from gi.repository import Gtk, GdkPixbuf, Gdk, GLib
 from gi.repository import Pango, PangoCairo
 import cairo
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+
+# Maximum number of Pango layouts shared between sprite labels
+LAYOUT_CACHE_SIZE = 256
+
+# Pixbufs are converted to Cairo surfaces until they take up (bytes)
+SURFACE_BUDGET = 32 * 1024 * 1024
+
+# Maximum number of rendered images (at any device scale) kept
+IMAGE_CACHE_SIZE = 64
+
+# Sprites re-rendered per idle callback after a change of scale
+REFRESH_CHUNK = 64
 
 
 class Sprites:
     ''' A class for the list of sprites and everything they share in common '''
 
-    def __init__(self, widget):
+    def __init__(self, widget, cell_size=None):
         ''' Initialize an empty array of sprites '''
         self.cr = None
         self.widget = widget
-        self.list = []
+        self.list = []  # sorted by z-order
+        self._keys = []  # (layer, sequence) for each sprite in self.list
+        self._z = {}  # sprite -> (layer, sequence)
+        self._sequence = 0
+        self._layouts = OrderedDict()  # shared label layouts
+        self._batching = False
+        self._damage = None  # union of rectangles invalidated in a batch
+        # Static sprites are drawn once into a background surface
+        self._static = set()
+        self._background = None
+        # Pixbufs converted to surfaces, shared by the sprites using them
+        self.surface_budget = SURFACE_BUDGET
+        self.surface_bytes = 0
+        self._surfaces = {}  # pixbuf -> [surface, bytes, users]
+        self._pixbufs = {}  # surface -> pixbuf
+        # Images rendered by sprite sources, at each device scale
+        self.device_scale = 1
+        self._images = OrderedDict()  # (key, scale) -> surface
+        self.image_cache_hits = 0
+        self.image_cache_misses = 0
+        self._sourced = set()  # sprites with an image source
+        self._stale = deque()  # sprites waiting to be re-rendered
+        self._stale_set = set()
+        self._refresh_id = None
+        # Optional uniform-grid index for hit testing
+        self._cell_size = None
+        self._grid = {}  # (column, row) -> sprites overlapping that cell
+        self._cells = {}  # sprite -> cells it is indexed under
+        self.set_index_cell_size(cell_size)
+
+    def set_index_cell_size(self, cell_size):
+        ''' Enable the hit-test index with cells of cell_size pixels
+        (or disable it with None) '''
+        self._cell_size = cell_size
+        self._grid = {}
+        self._cells = {}
+        if cell_size:
+            for spr in self.list:
+                self._index_add(spr)
+
+    def _index_add(self, spr):
+        ''' Add a sprite to the cells its rectangle overlaps '''
+        if not self._cell_size:
+            return
+        c = self._cell_size
+        x, y, w, h = spr.rect
+        cells = []
+        for column in range(x // c, (x + w) // c + 1):
+            for row in range(y // c, (y + h) // c + 1):
+                self._grid.setdefault((column, row), []).append(spr)
+                cells.append((column, row))
+        self._cells[spr] = cells
+
+    def _index_remove(self, spr):
+        ''' Remove a sprite from the hit-test index '''
+        for cell in self._cells.pop(spr, []):
+            self._grid[cell].remove(spr)
+            if not self._grid[cell]:
+                del self._grid[cell]
+
+    def update_index(self, spr):
+        ''' Resync the index after a sprite has moved or changed size '''
+        if spr in self._cells:
+            self._index_remove(spr)
+            self._index_add(spr)
+
+    def use_surface(self, pixbuf):
+        ''' Return a Cairo surface with the pixels of pixbuf, converting
+        it only if no other sprite uses it already.  If the surfaces
+        would take up more than surface_budget bytes, return the pixbuf
+        itself. '''
+        entry = self._surfaces.get(pixbuf)
+        if entry is None:
+            size = 4 * pixbuf.get_width() * pixbuf.get_height()
+            if self.surface_bytes + size > self.surface_budget:
+                return pixbuf
+            surface = self._pixbuf_to_surface(pixbuf)
+            entry = self._surfaces[pixbuf] = [surface, size, 0]
+            self._pixbufs[surface] = pixbuf
+            self.surface_bytes += size
+        entry[2] += 1
+        return entry[0]
+
+    def release_surface(self, surface):
+        ''' A sprite no longer uses a surface from use_surface '''
+        pixbuf = self._pixbufs.get(surface)
+        if pixbuf is None:
+            return
+        entry = self._surfaces[pixbuf]
+        entry[2] -= 1
+        if entry[2] == 0:
+            del self._surfaces[pixbuf]
+            del self._pixbufs[surface]
+            self.surface_bytes -= entry[1]
+
+    def get_pixbuf(self, image):
+        ''' The pixbuf an image was converted from, if it was '''
+        return self._pixbufs.get(image, image)
+
+    def _pixbuf_to_surface(self, pixbuf):
+        ''' Paint a pixbuf into a surface in the format of the window '''
+        width = pixbuf.get_width()
+        height = pixbuf.get_height()
+        window = self.widget.get_window()
+        if window is not None:
+            surface = window.create_similar_image_surface(
+                cairo.FORMAT_ARGB32, width, height, 1)
+        else:
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        cr = cairo.Context(surface)
+        Gdk.cairo_set_source_pixbuf(cr, pixbuf, 0, 0)
+        cr.paint()
+        return surface
+
+    def cached_image(self, key, factory, scale=None):
+        ''' Return the image for key at a device scale (by default, the
+        current one), calling factory(scale) to render it if it is not
+        cached already.  The factory returns a surface with its device
+        scale set, so its logical size is the same at every scale. '''
+        if scale is None:
+            scale = self.device_scale
+        cache_key = (key, scale)
+        if cache_key in self._images:
+            self.image_cache_hits += 1
+            self._images.move_to_end(cache_key)
+            return self._images[cache_key]
+
+        self.image_cache_misses += 1
+        image = factory(scale)
+        self._images[cache_key] = image
+        # Evict the least recently used images
+        while len(self._images) > IMAGE_CACHE_SIZE:
+            self._images.popitem(last=False)
+        return image
+
+    def has_image(self, key):
+        ''' Is the image for key cached at the current device scale? '''
+        return (key, self.device_scale) in self._images
+
+    def clear_image_cache(self):
+        self._images.clear()
+
+    def set_device_scale(self, scale):
+        ''' Change the device scale (e.g. 2 on a HiDPI screen) and
+        re-render the images of sprites with a source, a few at a time
+        when the main loop is idle. '''
+        if scale == self.device_scale:
+            return
+        self.device_scale = scale
+        self._background = None
+        self.refresh(self._sourced)
+
+    def refresh(self, sprites):
+        ''' Queue sprites to re-render their sources, those that can be
+        seen first '''
+        sprites = set(sprites) - self._stale_set
+        if not sprites:
+            return
+        visible = [spr for spr in self.list if spr in sprites]
+        hidden = sprites.difference(visible)
+        self._stale.extend(visible)
+        self._stale.extend(hidden)
+        self._stale_set.update(sprites)
+        if self._refresh_id is None:
+            self._refresh_id = GLib.idle_add(self._refresh_cb)
+
+    def _refresh_cb(self):
+        self.begin_batch()
+        for i in range(min(REFRESH_CHUNK, len(self._stale))):
+            spr = self._stale.popleft()
+            self._stale_set.discard(spr)
+            spr.render_sources()
+        self.end_batch()
+        if self._stale:
+            return True
+        self._refresh_id = None
+        return False
+
+    def flush_refresh(self):
+        ''' Re-render every queued sprite now '''
+        if self._refresh_id is not None:
+            GLib.source_remove(self._refresh_id)
+            self._refresh_id = None
+        while self._stale:
+            self._refresh_cb()
 
     def set_cairo_context(self, cr):
         ''' Cairo context may be set or reset after __init__ '''
@@ -495,26 +693,85 @@ class Sprites:
         ''' How many sprites are there? '''
         return(len(self.list))
 
+    def _next_key(self, layer):
+        ''' A z-order key above every sprite already in the layer '''
+        self._sequence += 1
+        return (layer, self._sequence)
+
     def append_to_list(self, spr):
-        ''' Append a new sprite to the end of the list. '''
-        self.list.append(spr)
+        ''' Add a sprite on top of the other sprites in its layer. '''
+        key = self._next_key(spr.layer)
+        i = bisect_right(self._keys, key)
+        self.list.insert(i, spr)
+        self._keys.insert(i, key)
+        self._z[spr] = key
+        self._index_add(spr)
 
     def insert_in_list(self, spr, i):
-        ''' Insert a sprite at position i. '''
-        if i < 0:
-            self.list.insert(0, spr)
-        elif i > len(self.list) - 1:
-            self.list.append(spr)
+        ''' Insert a sprite at position i.  If its layer does not fit
+        between its new neighbors, spr.layer is changed to the nearest
+        layer that does. '''
+        i = min(max(i, 0), len(self.list))
+        if i > 0 and spr.layer < self._keys[i - 1][0]:
+            spr.layer = self._keys[i - 1][0]
+        if i < len(self.list) and spr.layer > self._keys[i][0]:
+            spr.layer = self._keys[i][0]
+        below = self._keys[i - 1] if i > 0 else None
+        above = self._keys[i] if i < len(self.list) else None
+        if below is not None and below[0] == spr.layer:
+            if above is not None and above[0] == spr.layer:
+                key = (spr.layer, (below[1] + above[1]) / 2.)
+            else:
+                key = (spr.layer, below[1] + 1)
+        elif above is not None and above[0] == spr.layer:
+            key = (spr.layer, above[1] - 1)
         else:
-            self.list.insert(i, spr)
+            key = self._next_key(spr.layer)
+        # Keys handed out later must stay above this one
+        self._sequence = max(self._sequence, key[1])
+        self.list.insert(i, spr)
+        self._keys.insert(i, key)
+        self._z[spr] = key
+        self._index_add(spr)
 
     def remove_from_list(self, spr):
         ''' Remove a sprite from the list. '''
-        if spr in self.list:
-            self.list.remove(spr)
+        key = self._z.pop(spr, None)
+        if key is None:
+            return
+        i = bisect_left(self._keys, key)
+        while self.list[i] is not spr:
+            i += 1  # a sprite with the same key
+        del self.list[i]
+        del self._keys[i]
+        self._index_remove(spr)
+
+    def set_layers(self, layers):
+        ''' Set the layers of many sprites at once, where layers is a
+        list of (sprite, layer).  Hidden sprites are restored. '''
+        for spr, layer in layers:
+            spr.layer = layer
+            if spr not in self._z:
+                self._index_add(spr)
+            self._z[spr] = self._next_key(layer)
+        order = sorted(self._z.items(), key=lambda item: item[1])
+        self.list = [spr for spr, key in order]
+        self._keys = [key for spr, key in order]
+        for spr, layer in layers:
+            spr.inval()
 
     def find_sprite(self, pos):
         ''' Search based on (x, y) position. Return the 'top/first' one. '''
+        if self._cell_size:
+            cell = (int(pos[0]) // self._cell_size,
+                    int(pos[1]) // self._cell_size)
+            hits = [spr for spr in self._grid.get(cell, []) if spr.hit(pos)]
+            if len(hits) > 1:
+                # Overlapping sprites: the last one drawn is on top
+                return max(hits, key=self._z.get)
+            elif hits:
+                return hits[0]
+            return None
         list = self.list[:]
         list.reverse()
         for spr in list:
@@ -522,8 +779,83 @@ class Sprites:
                 return spr
         return None
 
+    def set_static(self, spr, static=True):
+        ''' Draw a sprite into the cached background, beneath every
+        sprite that is not static, or take it back out '''
+        if static:
+            self._static.add(spr)
+        else:
+            self._static.discard(spr)
+        self._background = None
+
+    def invalidate_background(self):
+        ''' Redraw the static sprites into the background next time '''
+        self._background = None
+
+    def _paint_background(self, cr, area):
+        ''' Copy area of the static background to cr, drawing the
+        background first if it has been invalidated '''
+        width = int(self.widget.get_allocated_width() * self.device_scale)
+        height = int(self.widget.get_allocated_height() * self.device_scale)
+        if self._background is None or \
+                (self._background.get_width(),
+                 self._background.get_height()) != (width, height):
+            self._background = cr.get_target().create_similar_image(
+                cairo.FORMAT_ARGB32, width, height)
+            self._background.set_device_scale(self.device_scale,
+                                              self.device_scale)
+            bg = cairo.Context(self._background)
+            for spr in self.list:
+                if spr.static:
+                    spr.draw(cr=bg)
+        cr.save()
+        cr.set_source_surface(self._background, 0, 0)
+        cr.rectangle(area[0], area[1], area[2], area[3])
+        cr.fill()
+        cr.restore()
+
+    def begin_batch(self):
+        ''' Collect invalidated rectangles until end_batch is called '''
+        self._batching = True
+
+    def end_batch(self):
+        ''' Queue a single redraw covering everything invalidated in the
+        batch '''
+        self._batching = False
+        if self._damage is not None:
+            x1, y1, x2, y2 = self._damage
+            self._damage = None
+            self.widget.queue_draw_area(x1, y1, x2 - x1, y2 - y1)
+
+    def invalidate(self, rect):
+        ''' Queue a redraw of an (x, y, width, height) rectangle '''
+        if not self._batching:
+            self.widget.queue_draw_area(rect[0], rect[1], rect[2], rect[3])
+        elif self._damage is None:
+            self._damage = (rect[0], rect[1],
+                            rect[0] + rect[2], rect[1] + rect[3])
+        else:
+            self._damage = (min(self._damage[0], rect[0]),
+                            min(self._damage[1], rect[1]),
+                            max(self._damage[2], rect[0] + rect[2]),
+                            max(self._damage[3], rect[1] + rect[3]))
+
+    def get_layout(self, cr, text, font, scale, rescale, width):
+        ''' Return a (layout, width, height) for a label, laying it out
+        only if no other label with the same attributes has been. '''
+        key = (text, font, scale, rescale, width)
+        if key in self._layouts:
+            self._layouts.move_to_end(key)
+            return self._layouts[key]
+        layout = _layout_label(cr, text, font, scale, rescale, width)
+        self._layouts[key] = layout
+        while len(self._layouts) > LAYOUT_CACHE_SIZE:
+            self._layouts.popitem(last=False)
+        return layout
+
     def redraw_sprites(self, area=None, cr=None):
-        ''' Redraw the sprites that intersect area. '''
+        ''' Redraw the sprites that intersect area (by default, the
+        clip region of the Cairo context). '''
         # I think I need to do this to save Cairo some work
         if cr is None:
             cr = self.cr
@@ -532,13 +864,60 @@ class Sprites:
         if cr is None:
             print('sprites.redraw_sprites: no Cairo context')
             return
-        for spr in self.list:
-            if area is None:
+        if area is None:
+            x1, y1, x2, y2 = cr.clip_extents()
+            area = (x1, y1, x2 - x1, y2 - y1)
+        elif not isinstance(area, (list, tuple)):  # Gdk.Rectangle
+            area = (area.x, area.y, area.width, area.height)
+        if any(spr in self._z for spr in self._static):
+            self._paint_background(cr, area)
+        for spr in self._sprites_in_area(area):
+            if not spr.static and _overlaps(spr.rect, area):
                 spr.draw(cr=cr)
-            else:
-                intersection = spr.rect.intersect(area)
-                if intersection.width > 0 or intersection.height > 0:
-                    spr.draw(cr=cr)
+
+    def _sprites_in_area(self, area):
+        ''' Candidate sprites for an area, in drawing order '''
+        if not self._cell_size:
+            return self.list
+        c = self._cell_size
+        columns = range(int(area[0] // c), int((area[0] + area[2]) // c) + 1)
+        rows = range(int(area[1] // c), int((area[1] + area[3]) // c) + 1)
+        if len(columns) * len(rows) > len(self.list):
+            return self.list
+        candidates = set()
+        for column in columns:
+            for row in rows:
+                candidates.update(self._grid.get((column, row), []))
+        return sorted(candidates, key=self._z.get)
+
+
+def _layout_label(cr, text, font, scale, rescale, width):
+    ''' Lay out a label, shrinking or truncating it to fit in width '''
+    fd = Pango.FontDescription(font)
+    pl = PangoCairo.create_layout(cr)
+    pl.set_text(text, -1)
+    fd.set_size(int(scale * Pango.SCALE))
+    pl.set_font_description(fd)
+    w = pl.get_size()[0] / Pango.SCALE
+    if w > width:
+        if rescale:
+            fd.set_size(int(scale * Pango.SCALE * width / w))
+            pl.set_font_description(fd)
+            w = pl.get_size()[0] / Pango.SCALE
+        else:
+            j = len(text) - 1
+            while(w > width and j > 0):
+                pl.set_text("…" + text[len(text) - j:], -1)
+                w = pl.get_size()[0] / Pango.SCALE
+                j -= 1
+    h = pl.get_size()[1] / Pango.SCALE
+    return (pl, w, h)
+
+
+def _overlaps(rect, area):
+    ''' Do two (x, y, width, height) rectangles intersect? '''
+    return rect[0] < area[0] + area[2] and area[0] < rect[0] + rect[2] and \
+        rect[1] < area[1] + area[3] and area[1] < rect[1] + rect[3]
 
 
 class Sprite:
@@ -556,11 +935,15 @@ class Sprite:
         self._x_pos = [None]
         self._y_pos = [None]
         self._fd = None
+        self._font = None
+        self._layouts = {}  # label index -> (layout, width, height)
+        self._sources = {}  # image index -> (key, factory)
         self._bold = False
         self._italic = False
         self._color = None
         self._margins = [0, 0, 0, 0]
         self.layer = 100
+        self.static = False
         self.labels = []
         self.images = []
         self._dx = []  # image offsets
@@ -575,14 +958,26 @@ class Sprite:
             self.images.append(None)
             self._dx.append(0)
             self._dy.append(0)
-        self.images[i] = image
         self._dx[i] = dx
         self._dy[i] = dy
-        if hasattr(self.images[i], 'get_width'):
-            w = self.images[i].get_width()
-            h = self.images[i].get_height()
+        if isinstance(image, cairo.ImageSurface):
+            # The logical size of surfaces rendered for a HiDPI screen
+            sx, sy = image.get_device_scale()
+            w = int(image.get_width() / sx)
+            h = int(image.get_height() / sy)
+        elif hasattr(image, 'get_width'):
+            w = image.get_width()
+            h = image.get_height()
         else:
-            w, h = self.images[i].get_size()
+            w, h = image.get_size()
+        # Convert pixbufs once here rather than every time we draw
+        old = self.images[i]
+        if isinstance(image, GdkPixbuf.Pixbuf):
+            image = self._sprites.use_surface(image)
+        self.images[i] = image
+        if old is not None:
+            self._sprites.release_surface(old)
+        size = (self.rect[2], self.rect[3])
         if i == 0:  # Always reset width and height when base image changes.
             self.rect[2] = w + dx
             self.rect[3] = h + dy
@@ -591,11 +986,32 @@ class Sprite:
                 self.rect[2] = w + dx
             if h + dy > self.rect[3]:
                 self.rect[3] = h + dy
+        if size != (self.rect[2], self.rect[3]):
+            self._layouts = {}
+        self._sprites.update_index(self)
+
+    def set_source(self, key, factory, i=0, lazy=False):
+        ''' Use the image for key from the sprites image cache, which
+        calls factory(scale) to render it at each device scale.  If lazy
+        and it is not rendered yet, keep the current image until the
+        main loop is idle. '''
+        self._sources[i] = (key, factory)
+        self._sprites._sourced.add(self)
+        if lazy and not self._sprites.has_image(key):
+            self._sprites.refresh([self])
+            return
+        self.set_shape(self._sprites.cached_image(key, factory), i)
+
+    def render_sources(self):
+        ''' Update images from their sources at the device scale '''
+        for i, (key, factory) in self._sources.items():
+            self.set_shape(self._sprites.cached_image(key, factory), i)
 
     def move(self, pos):
         ''' Move to new (x, y) position '''
         self.inval()
         self.rect[0], self.rect[1] = int(pos[0]), int(pos[1])
+        self._sprites.update_index(self)
         self.inval()
 
     def move_relative(self, pos):
@@ -603,6 +1019,7 @@ class Sprite:
         self.inval()
         self.rect[0] += int(pos[0])
         self.rect[1] += int(pos[1])
+        self._sprites.update_index(self)
         self.inval()
 
     def get_xy(self):
@@ -624,15 +1041,11 @@ class Sprite:
         self.inval()
 
     def set_layer(self, layer=None):
-        ''' Set the layer for a sprite '''
+        ''' Move a sprite on top of its layer, after changing self.layer
+        to layer if it is given '''
         self._sprites.remove_from_list(self)
         if layer is not None:
             self.layer = layer
-        for i in range(self._sprites.length_of_list()):
-            if self.layer < self._sprites.get_sprite(i).layer:
-                self._sprites.insert_in_list(self, i)
-                self.inval()
-                return
         self._sprites.append_to_list(self)
         self.inval()
 
@@ -644,11 +1057,13 @@ class Sprite:
             self.labels[i] = new_label.replace("\0", " ")
         else:
             self.labels[i] = str(new_label).encode()
+        self._layouts = {}
         self.inval()
 
     def set_margins(self, l=0, t=0, r=0, b=0):
         ''' Set the margins for drawing the label '''
         self._margins = [l, t, r, b]
+        self._layouts = {}
 
     def _extend_labels_array(self, i):
         ''' Append to the labels attribute list '''
@@ -667,7 +1082,9 @@ class Sprite:
 
     def set_font(self, font):
         ''' Set the font for a label '''
+        self._font = font
         self._fd = Pango.FontDescription(font)
+        self._layouts = {}
 
     def set_label_color(self, rgb):
         ''' Set the font color for a label '''
@@ -694,6 +1111,14 @@ class Sprite:
         self._vert_align[i] = vert_align
         self._x_pos[i] = x_pos
         self._y_pos[i] = y_pos
+        self._layouts = {}
+
+    def set_static(self, static=True):
+        ''' Draw the sprite into the cached background of the sprites,
+        beneath the sprites that change '''
+        self.static = static
+        self._sprites.set_static(self, static)
+        self.inval()
 
     def hide(self):
         ''' Hide a sprite '''
@@ -707,10 +1132,9 @@ class Sprite:
     def inval(self):
         ''' Invalidate a region for gtk '''
         # self._sprites.window.invalidate_rect(self.rect, False)
-        self._sprites.widget.queue_draw_area(self.rect[0],
-                                             self.rect[1],
-                                             self.rect[2],
-                                             self.rect[3])
+        if self.static:
+            self._sprites.invalidate_background()
+        self._sprites.invalidate(self.rect)
 
     def draw(self, cr=None):
         ''' Draw the sprite (and label) '''
@@ -729,7 +1153,7 @@ class Sprite:
                              self.rect[2],
                              self.rect[3])
                 cr.fill()
-            elif type(img) == cairo.ImageSurface:
+            elif isinstance(img, cairo.Surface):
                 cr.set_source_surface(img, self.rect[0] + self._dx[i],
                                       self.rect[1] + self._dy[i])
                 cr.rectangle(self.rect[0] + self._dx[i],
@@ -762,26 +1186,11 @@ class Sprite:
             my_width = 0
         my_height = self.rect[3] - self._margins[1] - self._margins[3]
         for i in range(len(self.labels)):
-            pl = PangoCairo.create_layout(cr)
-            pl.set_text(str(self.labels[i]), -1)
-            self._fd.set_size(int(self._scale[i] * Pango.SCALE))
-            pl.set_font_description(self._fd)
-            w = pl.get_size()[0] / Pango.SCALE
-            if w > my_width:
-                if self._rescale[i]:
-                    self._fd.set_size(
-                            int(self._scale[i] * Pango.SCALE * my_width / w))
-                    pl.set_font_description(self._fd)
-                    w = pl.get_size()[0] / Pango.SCALE
-                else:
-                    j = len(self.labels[i]) - 1
-                    while(w > my_width and j > 0):
-                        pl.set_text(
-                            "…" + self.labels[i][len(self.labels[i]) - j:], -1)
-                        self._fd.set_size(int(self._scale[i] * Pango.SCALE))
-                        pl.set_font_description(self._fd)
-                        w = pl.get_size()[0] / Pango.SCALE
-                        j -= 1
+            if i not in self._layouts:
+                self._layouts[i] = self._sprites.get_layout(
+                    cr, str(self.labels[i]), self._font, self._scale[i],
+                    self._rescale[i], my_width)
+            pl, w, h = self._layouts[i]
             if self._x_pos[i] is not None:
                 x = int(self.rect[0] + self._x_pos[i])
             elif self._horiz_align[i] == "center":
@@ -790,7 +1199,6 @@ class Sprite:
                 x = int(self.rect[0] + self._margins[0])
             else: # right
                 x = int(self.rect[0] + self.rect[2] - w - self._margins[2])
-            h = pl.get_size()[1] / Pango.SCALE
             if self._y_pos[i] is not None:
                 y = int(self.rect[1] + self._y_pos[i])
             elif self._vert_align[i] == "middle":
@@ -838,12 +1246,13 @@ class Sprite:
         x, y = pos
         x = x - self.rect[0]
         y = y - self.rect[1]
-        if y > self.images[i].get_height() - 1:
+        image = self._sprites.get_pixbuf(self.images[i])
+        if y > image.get_height() - 1:
             return(-1, -1, -1, -1)
         try:
-            array = self.images[i].get_pixels()
+            array = image.get_pixels()
             if array is not None:
-                offset = (y * self.images[i].get_width() + x) * 4
+                offset = (y * image.get_width() + x) * 4
                 r, g, b, a = ord(array[offset]), ord(array[offset + 1]),\
                              ord(array[offset + 2]), ord(array[offset + 3])
                 return(r, g, b, a)
@@ -0,0 +1,113 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+import random
+import unittest
+
+from board import Board, HORIZONTAL, VERTICAL, BILATERAL
+
+
+class BoardTest(unittest.TestCase):
+
+    def test_odd_dimensions(self):
+        self.assertRaises(ValueError, Board, 5, 6)
+
+    def test_symmetry(self):
+        for orientation in [HORIZONTAL, VERTICAL, BILATERAL]:
+            board = Board(10, 6, orientation)
+            self.assertTrue(board.is_symmetric())
+            board.set(13, 1)
+            self.assertFalse(board.is_symmetric())
+            for j in board.mirrors(13):
+                board.set(j, 1)
+            self.assertTrue(board.is_symmetric())
+
+    def test_mismatches_match_recount(self):
+        board = Board(10, 6, BILATERAL)
+        for n in range(500):
+            board.set(random.randrange(len(board)), random.randrange(4))
+            mismatches = board.mismatches
+            board.set_orientation(BILATERAL)
+            self.assertEqual(board.mismatches, mismatches)
+
+    def test_load(self):
+        board = Board(4, 2)
+        board.write(0, 3, 'a')
+        board.load([1] * 8, VERTICAL)
+        self.assertEqual(board.to_list(), [1] * 8)
+        self.assertEqual(board.orientation, VERTICAL)
+        self.assertEqual(list(board.clocks), [0] * 8)
+        self.assertRaises(ValueError, board.load, [1] * 6)
+
+
+class MergeTest(unittest.TestCase):
+
+    def test_latest_edit_wins(self):
+        a = Board(4, 2)
+        b = Board(4, 2)
+        clock_a = a.write(0, 1, 'a')
+        clock_b = b.write(0, 3, 'b')
+        self.assertEqual(clock_a, clock_b)
+        # Same time: the author breaks the tie on both boards
+        self.assertTrue(a.merge(0, 3, clock_b, 'b'))
+        self.assertFalse(b.merge(0, 1, clock_a, 'a'))
+        self.assertEqual(a.cells, b.cells)
+
+    def test_any_order_converges(self):
+        boards = [Board(10, 6) for i in range(3)]
+        pending = []
+        for n in range(2000):
+            p = random.randrange(3)
+            i = random.randrange(60)
+            color = random.randrange(4)
+            clock = boards[p].write(i, color, 'abc'[p])
+            pending += [(q, i, color, clock, 'abc'[p])
+                        for q in range(3) if q != p]
+            random.shuffle(pending)
+            while pending and random.random() < 0.5:
+                q, i, color, clock, author = pending.pop()
+                boards[q].merge(i, color, clock, author)
+        for q, i, color, clock, author in pending:
+            boards[q].merge(i, color, clock, author)
+        self.assertEqual(len(set(bytes(b.cells) for b in boards)), 1)
+
+    def test_late_joiner(self):
+        ''' A board loaded from a snapshot makes edits newer than those
+        in the snapshot once it has observed the sharer's clock '''
+        a = Board(10, 6)
+        for n in range(20):
+            a.write(5, n % 4, 'a')
+        b = Board(10, 6)
+        b.load(a.to_list(), clock=a.clock)
+        # An edit made before the snapshot arrives late and is ignored
+        self.assertFalse(b.merge(5, 1, 7, 'a'))
+        self.assertEqual(b.to_list(), a.to_list())
+        clock = b.write(5, 3, 'b')
+        self.assertTrue(a.merge(5, 3, clock, 'b'))
+        self.assertEqual(a.cells, b.cells)
+
+    def test_row_repair(self):
+        a = Board(10, 6)
+        b = Board(10, 6)
+        a.write(12, 1, 'a')
+        b.write(47, 3, 'b')
+        for y in range(6):
+            colors, clocks, authors = a.row_state(y)
+            for x in range(10):
+                b.merge(y * 10 + x, colors[x], clocks[x], authors[x])
+            colors, clocks, authors = b.row_state(y)
+            for x in range(10):
+                a.merge(y * 10 + x, colors[x], clocks[x], authors[x])
+        self.assertEqual(a.checksum(), b.checksum())
+        self.assertEqual(a.row_checksums(), b.row_checksums())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+import unittest
+from base64 import b64encode
+
+from codec import pack_cells, unpack_cells, encode_game, decode_game, \
+    encode_clicks, decode_clicks, encode_state, decode_state
+
+
+def _text(data):
+    return b64encode(data).decode('ascii')
+
+
+class CellsTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for count in range(0, 9):
+            cells = [i % 11 for i in range(count)]
+            packed = pack_cells(cells)
+            self.assertEqual(len(packed), (count + 1) // 2)
+            self.assertEqual(list(unpack_cells(packed, count)), cells)
+
+    def test_short(self):
+        self.assertRaises(ValueError, unpack_cells, b'\x12', 3)
+
+
+class GameTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        dots = [i % 11 for i in range(60)]
+        self.assertEqual(decode_game(encode_game(dots, 'bilateral', 10, 6)),
+                         [dots, 'bilateral', 10, 6])
+
+    def test_bad_input(self):
+        for text in [None, '', '!!', _text(b'\x02'), _text(b'\x01\x00'),
+                     _text(b'\x01\x07\x00\x02\x00\x02\x00\x00'),
+                     _text(b'\x01\x00\x00\x03\x00\x02\x00\x00'),
+                     _text(b'\x01\x00\x00\x00\x00\x02'),
+                     encode_game([0] * 60, 'vertical', 10, 6)[:-8]]:
+            self.assertRaises(ValueError, decode_game, text)
+
+
+class ClicksTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        clicks = [(0, 3), (59, 10), (70000, 2)]
+        self.assertEqual(decode_clicks(encode_clicks(clicks)), clicks)
+        self.assertEqual(decode_clicks(encode_clicks([])), [])
+
+    def test_bad_input(self):
+        text = encode_clicks([(1, 2), (3, 4)])
+        for bad in [None, '!!', _text(b'\x01'), _text(b'\x02\x00\x00'),
+                    text[:-4]]:
+            self.assertRaises(ValueError, decode_clicks, bad)
+
+
+class StateTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        dots = [i % 4 for i in range(24)]
+        state = decode_state(encode_state(dots, 'vertical', 6, 4,
+                                          roygbiv=True, robot=False))
+        self.assertEqual(state, [dots, 'vertical', 6, 4, True, False])
+
+    def test_bad_input(self):
+        state = encode_state([0] * 60, 'horizontal', 10, 6)
+        for bad in [b'', b'\x02' + state[1:], state[:4], state[:-1],
+                    state[:1] + b'\x09' + state[2:]]:
+            self.assertRaises(ValueError, decode_state, bad)
+
+
+if __name__ == '__main__':
+    unittest.main()
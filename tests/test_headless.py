@@ -0,0 +1,77 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from headless import HeadlessGame
+except ImportError as e:  # needs PyGObject and pycairo
+    HeadlessGame = None
+    _missing = str(e)
+else:
+    _missing = ''
+
+from recorder import Recorder, Replay
+
+
+@unittest.skipIf(HeadlessGame is None, _missing)
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self.path = os.path.join(self._dir, 'session.rec')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_replay_drives_game(self):
+        harness = HeadlessGame()
+        game = harness.game
+        game.recorder = Recorder(self.path)
+        game.new_game('bilateral')
+        harness.click(*harness.dot_center(0))
+        harness.click(*harness.dot_center(7))
+        finished = game.save_game()
+        game.recorder.close()
+        game.recorder = None
+
+        replay = Replay(self.path)
+        other = HeadlessGame()
+        self.assertFalse(other.restore_game(replay, -1))
+        self.assertTrue(other.restore_game(replay, replay.duration))
+        self.assertEqual(other.game.save_game(), finished)
+        self.assertEqual([dot.type for dot in other.game._dots],
+                         finished[0])
+
+
+@unittest.skipIf(HeadlessGame is None, _missing)
+class MergeTest(unittest.TestCase):
+
+    def test_bad_rows_change_nothing(self):
+        game = HeadlessGame(columns=10, rows=6).game
+        game.new_game('horizontal')
+        before = game.save_game()
+        good = [0, [3] * 10, [99] * 10, ['peer'] * 10]
+        for rows in [[[0, [1] * 9, [1] * 10, [''] * 10]],
+                     [[6, [1] * 10, [1] * 10, [''] * 10]],
+                     [good, [1, [99] * 10, [99] * 10, ['peer'] * 10]],
+                     [good, [1, [1] * 10, [-1] * 10, ['peer'] * 10]],
+                     [5]]:
+            self.assertRaises(ValueError, game.merge_rows, rows)
+            self.assertEqual(game.save_game(), before)
+        game.merge_rows([good])
+        self.assertEqual(game.save_game()[0][:10], [3] * 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
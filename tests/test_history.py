@@ -0,0 +1,144 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+import random
+import unittest
+
+from history import History, HISTORY_SIZE, MAX_AUTHORS, MAX_CELLS, \
+    pack_edit, unpack_edit
+
+
+def _move(cells, changes):
+    ''' Apply a list of (cell, color) and return the edits made '''
+    edits = []
+    for cell, color in changes:
+        edits.append((cell, cells[cell], color))
+        cells[cell] = color
+    return edits
+
+
+def _apply(cells, changes):
+    for cell, color in changes:
+        cells[cell] = color
+
+
+class PackTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for edit in [(0, 0, 0, 0), (MAX_CELLS - 1, 15, 15, 15),
+                     (1234, 3, 10, 7)]:
+            self.assertEqual(unpack_edit(pack_edit(*edit)), edit)
+
+    def test_records_are_32_bit(self):
+        history = History(bytearray(4), capacity=8)
+        self.assertEqual(history._records.itemsize, 4)
+
+
+class HistoryTest(unittest.TestCase):
+
+    def test_undo_redo(self):
+        cells = bytearray(8)
+        history = History(cells)
+        history.record(_move(cells, [(0, 1), (7, 1)]), 'a')
+        history.record(_move(cells, [(3, 2)]), 'a')
+        _apply(cells, history.undo(cells, 'a'))
+        self.assertEqual(list(cells), [1, 0, 0, 0, 0, 0, 0, 1])
+        _apply(cells, history.undo(cells, 'a'))
+        self.assertEqual(list(cells), [0] * 8)
+        self.assertFalse(history.can_undo('a'))
+        _apply(cells, history.redo(cells, 'a'))
+        self.assertEqual(list(cells), [1, 0, 0, 0, 0, 0, 0, 1])
+        self.assertEqual(history.replay(), cells)
+
+    def test_undo_is_per_author(self):
+        cells = bytearray(4)
+        history = History(cells)
+        history.record(_move(cells, [(0, 1)]), 'a')
+        history.record(_move(cells, [(1, 2)]), 'b')
+        _apply(cells, history.undo(cells, 'a'))
+        self.assertEqual(list(cells), [0, 2, 0, 0])
+        # Someone else changed the cell since: it is left alone
+        history.record(_move(cells, [(1, 3)]), 'a')
+        self.assertEqual(history.undo(cells, 'b'), [])
+
+    def test_redo_is_per_author(self):
+        cells = bytearray(4)
+        history = History(cells)
+        history.record(_move(cells, [(0, 1)]), 'a')
+        history.record(_move(cells, [(1, 2)]), 'b')
+        _apply(cells, history.undo(cells, 'a'))
+        _apply(cells, history.undo(cells, 'b'))
+        self.assertTrue(history.can_redo('a'))
+        self.assertFalse(history.can_redo('c'))
+        self.assertEqual(history.redo(cells, 'c'), [])
+        self.assertEqual(history.redo(cells, 'a'), [(0, 1)])
+        self.assertEqual(history.redo(cells, 'b'), [(1, 2)])
+        self.assertFalse(history.can_redo('a'))
+
+    def test_new_move_clears_redo(self):
+        cells = bytearray(4)
+        history = History(cells)
+        history.record(_move(cells, [(0, 1)]), 'a')
+        _apply(cells, history.undo(cells, 'a'))
+        history.record(_move(cells, [(2, 1)]), 'a')
+        self.assertFalse(history.can_redo('a'))
+
+    def test_ring_wraps(self):
+        cells = bytearray(100)
+        start = bytearray(cells)
+        history = History(cells, capacity=64)
+        for n in range(1000):
+            history.record(_move(cells, [(random.randrange(100),
+                                          random.randrange(4))
+                                         for i in range(random.randint(1, 5))]),
+                           random.choice('ab'))
+            self.assertEqual(history.replay(), cells)
+        self.assertLessEqual(len(history), 64)
+        self.assertNotEqual(history.replay(0), start)
+
+    def test_move_larger_than_history(self):
+        ''' A full resync of a 100x60 board is more edits than the
+        history holds '''
+        cells = bytearray(6000)
+        history = History(cells)
+        history.record(_move(cells, [(0, 1)]), 'a')
+        history.record(_move(cells, [(i, 3) for i in range(6000)]), 'b')
+        self.assertGreater(6000, HISTORY_SIZE)
+        self.assertEqual(history.replay(), cells)
+        self.assertFalse(history.can_undo('b'))
+        history.record(_move(cells, [(5, 1)]), 'b')
+        _apply(cells, history.undo(cells, 'b'))
+        self.assertEqual(cells[5], 3)
+        self.assertEqual(history.replay(), cells)
+
+    def test_authors_past_the_table(self):
+        ''' Authors sharing the last index cannot undo each other's
+        moves, or anyone's '''
+        cells = bytearray(64)
+        history = History(cells)
+        authors = ['player%d' % n for n in range(MAX_AUTHORS + 2)]
+        for n, author in enumerate(authors):
+            history.record(_move(cells, [(n, 1)]), author)
+        self.assertTrue(history.can_undo(authors[MAX_AUTHORS - 2]))
+        for author in authors[MAX_AUTHORS - 1:]:
+            self.assertFalse(history.can_undo(author))
+            self.assertEqual(history.undo(cells, author), [])
+        self.assertEqual(history.replay(), cells)
+        _apply(cells, history.undo(cells, authors[0]))
+        self.assertEqual(cells[0], 0)
+        self.assertEqual(cells[MAX_AUTHORS + 1], 1)
+        self.assertEqual(history.replay(), cells)
+
+    def test_too_many_cells(self):
+        self.assertRaises(ValueError, History, bytearray(MAX_CELLS + 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+import unittest
+
+from codec import CODEC_VERSION
+
+try:
+    from collabwrapper import CollabWrapper
+    from loopback import LoopbackHub
+except ImportError as e:  # needs PyGObject, Telepathy and sugar3
+    CollabWrapper = None
+    _missing = str(e)
+else:
+    _missing = ''
+
+
+class _Player():
+    ''' Shares a game over a LoopbackHub, announcing the codec the way
+    ReflectionActivity does '''
+
+    def __init__(self, hub, nick):
+        self.game = [0] * 8
+        self.buddies = set()
+        self.codec_buddies = set()
+        self.collab = CollabWrapper(self, transport=hub.transport(nick))
+        self.collab.connect('message', self._message_cb)
+        self.collab.connect('joined', self._announce)
+        self.collab.connect('buddy_joined', self._buddy_joined_cb)
+        self.collab.setup()
+
+    def get_data(self):
+        return dict(game=self.game)
+
+    def set_data(self, data):
+        self.game = data['game']
+
+    def _announce(self, collab=None):
+        self.collab.post(dict(action='v', payload=CODEC_VERSION),
+                         key='v', state=False)
+
+    def _buddy_joined_cb(self, collab, buddy):
+        self.buddies.add(buddy.props.key)
+        self._announce()
+
+    def _message_cb(self, collab, buddy, message):
+        if message.get('action') == 'v':
+            self.codec_buddies.add(buddy.props.key)
+        elif message.get('action') == 'p':
+            self.game[message['payload']] += 1
+
+    def play(self, i):
+        self.game[i] += 1
+        self.collab.post(dict(action='p', payload=i))
+
+    def use_codec(self):
+        return self.buddies <= self.codec_buddies
+
+
+@unittest.skipIf(CollabWrapper is None, _missing)
+class LoopbackTest(unittest.TestCase):
+
+    def test_late_joiner_uses_codec(self):
+        hub = LoopbackHub()
+        leader = _Player(hub, 'leader')
+        leader.play(3)
+        hub.run()
+        joiner = _Player(hub, 'joiner')
+        hub.run()
+        self.assertEqual(joiner.game[3], 1)
+        self.assertEqual(joiner.buddies, joiner.codec_buddies)
+        self.assertTrue(joiner.buddies)
+        self.assertTrue(joiner.use_codec())
+        self.assertTrue(leader.use_codec())
+
+    def test_state_is_not_replayed(self):
+        ''' Messages the leader's state covers are not applied twice '''
+        hub = LoopbackHub()
+        leader = _Player(hub, 'leader')
+        joiner = _Player(hub, 'joiner')
+        leader.play(1)
+        hub.run()
+        joiner.play(2)
+        hub.run()
+        self.assertEqual(joiner.game, leader.game)
+        self.assertEqual(joiner.game[1], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
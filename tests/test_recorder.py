@@ -0,0 +1,121 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from board import Board
+from recorder import Recorder, Replay
+
+
+class RecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self.path = os.path.join(self._dir, 'session.rec')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _record(self, moves, snapshot_interval=8):
+        ''' Record a game and moves, one every second; return the
+        board after each move '''
+        board = Board(10, 6, 'vertical')
+        recorder = Recorder(self.path, snapshot_interval)
+        start = recorder._start
+        recorder.new_game(board.to_list(), board.orientation, board.columns,
+                          board.rows, when=start)
+        boards = [board.to_list()]
+        for n, move in enumerate(moves):
+            for i, color in move:
+                board.set(i, color)
+            recorder.edits(move, when=start + n + 1)
+            boards.append(board.to_list())
+        recorder.close()
+        return boards
+
+    def test_seek(self):
+        moves = [[(random.randrange(60), random.randrange(4))
+                  for j in range(random.randint(1, 3))] for i in range(50)]
+        boards = self._record(moves)
+        replay = Replay(self.path)
+        self.assertEqual(replay.duration, 50)
+        for n, expected in enumerate(boards):
+            self.assertEqual(replay.seek(n + 0.5).to_list(), expected)
+        self.assertEqual(replay.state(50),
+                         [boards[-1], 'vertical', 10, 6])
+
+    def test_frames(self):
+        boards = self._record([[(0, 1)], [(1, 1)], [(2, 1)]])
+        frames = list(Replay(self.path).frames(1.))
+        self.assertEqual([when for when, board in frames], [0, 1, 2, 3])
+        self.assertEqual(frames[-1][1].to_list(), boards[-1])
+
+    def test_truncated(self):
+        boards = self._record([[(0, 1)], [(1, 2)], [(2, 3)]])
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:-1])
+        replay = Replay(self.path)
+        self.assertEqual(len(replay), 3)  # the game and two moves
+        self.assertEqual(replay.seek(10).to_list(), boards[2])
+
+    def test_not_a_recording(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'RFLX' + b'\0' * 20)
+        self.assertRaises(ValueError, Replay, self.path)
+        with open(self.path, 'wb') as f:
+            f.write(b'RF')
+        self.assertRaises(ValueError, Replay, self.path)
+
+    def test_resume_appends(self):
+        boards = self._record([[(0, 1)], [(1, 2)]])
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:-1])  # the last record was cut short
+        recorder = Recorder(self.path)
+        self.assertEqual(recorder.records, 2)
+        recorder.new_game(boards[1], 'vertical', 10, 6)
+        recorder.edits([(2, 3)])
+        recorder.close()
+        replay = Replay(self.path)
+        self.assertEqual(len(replay), 4)
+        # The time between the sessions is left out
+        self.assertLess(replay.duration, 3)
+        expected = list(boards[1])
+        expected[2] = 3
+        self.assertEqual(replay.seek(replay.duration).to_list(), expected)
+
+    def test_restore(self):
+        boards = self._record([[(0, 1)], [(1, 2)]])
+
+        class Game():
+            def restore_game(self, *state):
+                self.state = state
+
+        game = Game()
+        replay = Replay(self.path)
+        self.assertFalse(replay.restore(game, -1))
+        self.assertTrue(replay.restore(game, 1))
+        self.assertEqual(game.state, (boards[1], 'vertical', 10, 6))
+
+    def test_large_move(self):
+        moves = [[(i, 3) for i in range(60)]] * 2
+        boards = self._record(moves, snapshot_interval=1)
+        self.assertEqual(Replay(self.path).seek(2).to_list(), boards[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,253 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+import random
+import unittest
+from unittest import mock
+
+try:
+    import cairo
+    import sprites as sprites_module
+    from sprites import Sprites, Sprite, LAYOUT_CACHE_SIZE
+except (ImportError, ValueError) as e:  # needs PyGObject and pycairo
+    Sprites = None
+    _missing = str(e)
+else:
+    _missing = ''
+
+
+class _Widget():
+    ''' Stands in for the drawing area '''
+
+    def queue_draw_area(self, x, y, width, height):
+        pass
+
+    def get_allocated_width(self):
+        return 800
+
+    def get_allocated_height(self):
+        return 600
+
+
+def _sprite(sprites, x, y, width, height, layer=100):
+    spr = Sprite(sprites, x, y,
+                 cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height))
+    spr.set_layer(layer)
+    return spr
+
+
+@unittest.skipIf(Sprites is None, _missing)
+class HitIndexTest(unittest.TestCase):
+
+    def _check(self, sprites, points):
+        ''' The index finds the same sprites as a scan of the list '''
+        found = [sprites.find_sprite(point) for point in points]
+        cell_size = sprites._cell_size
+        sprites.set_index_cell_size(None)
+        self.assertEqual(found,
+                         [sprites.find_sprite(point) for point in points])
+        sprites.set_index_cell_size(cell_size)
+
+    def test_matches_linear_search(self):
+        sprites = Sprites(_Widget(), cell_size=32)
+        sprs = [_sprite(sprites, random.randrange(400),
+                        random.randrange(300), random.randrange(1, 90),
+                        random.randrange(1, 90), random.randrange(3))
+                for i in range(60)]
+        points = [(random.randrange(-10, 500), random.randrange(-10, 400))
+                  for i in range(500)]
+        self._check(sprites, points)
+        for spr in random.sample(sprs, 20):
+            spr.move((random.randrange(400), random.randrange(300)))
+        for spr in random.sample(sprs, 10):
+            spr.hide()
+        for spr in random.sample(sprs, 10):
+            spr.set_layer(random.randrange(3))
+        self._check(sprites, points)
+
+    def test_large_sprite(self):
+        ''' A sprite spanning many cells is found from each of them '''
+        sprites = Sprites(_Widget(), cell_size=10)
+        big = _sprite(sprites, 5, 5, 100, 50)
+        small = _sprite(sprites, 50, 20, 10, 10)
+        for x in range(5, 106, 7):
+            for y in range(5, 56, 7):
+                expected = small if small.hit((x, y)) else big
+                self.assertIs(sprites.find_sprite((x, y)), expected)
+        self.assertIsNone(sprites.find_sprite((200, 200)))
+
+    def test_moved_sprite(self):
+        sprites = Sprites(_Widget(), cell_size=16)
+        spr = _sprite(sprites, 0, 0, 10, 10)
+        spr.move((300, 200))
+        self.assertIsNone(sprites.find_sprite((5, 5)))
+        self.assertIs(sprites.find_sprite((305, 205)), spr)
+        spr.hide()
+        self.assertIsNone(sprites.find_sprite((305, 205)))
+        spr.restore()
+        self.assertIs(sprites.find_sprite((305, 205)), spr)
+
+
+@unittest.skipIf(Sprites is None, _missing)
+class ZOrderTest(unittest.TestCase):
+
+    def _check(self, sprites):
+        ''' The keys are unique and sorted, and match the list '''
+        self.assertEqual(sprites._keys, sorted(sprites._keys))
+        self.assertEqual(len(set(sprites._keys)), len(sprites._keys))
+        self.assertEqual([sprites._z[spr] for spr in sprites.list],
+                         sprites._keys)
+        self.assertEqual([key[0] for key in sprites._keys],
+                         [spr.layer for spr in sprites.list])
+
+    def test_append_on_top_of_layer(self):
+        sprites = Sprites(_Widget())
+        a = _sprite(sprites, 0, 0, 10, 10, 2)
+        b = _sprite(sprites, 0, 0, 10, 10, 1)
+        c = _sprite(sprites, 0, 0, 10, 10, 2)
+        d = _sprite(sprites, 0, 0, 10, 10, 1)
+        self.assertEqual(sprites.list, [b, d, a, c])
+        b.set_layer()
+        self.assertEqual(sprites.list, [d, b, a, c])
+        self._check(sprites)
+
+    def test_insert(self):
+        sprites = Sprites(_Widget())
+        sprs = [_sprite(sprites, 0, 0, 10, 10) for i in range(3)]
+        new = _sprite(sprites, 0, 0, 10, 10)
+        sprites.remove_from_list(new)
+        sprites.insert_in_list(new, 1)
+        self.assertEqual(sprites.list, [sprs[0], new, sprs[1], sprs[2]])
+        # Twice at the same place: the keys must stay unique
+        other = _sprite(sprites, 0, 0, 10, 10)
+        sprites.remove_from_list(other)
+        sprites.insert_in_list(other, 1)
+        self.assertEqual(sprites.list[1:3], [other, new])
+        self._check(sprites)
+        # A layer that does not fit between the neighbors is changed
+        low = _sprite(sprites, 0, 0, 10, 10, 0)
+        top = _sprite(sprites, 0, 0, 10, 10, 200)
+        sprites.remove_from_list(top)
+        sprites.insert_in_list(top, 1)
+        self.assertEqual(sprites.list.index(top), 1)
+        self.assertEqual(top.layer, 100)
+        self._check(sprites)
+
+    def test_remove_equal_keys(self):
+        sprites = Sprites(_Widget())
+        sprs = [_sprite(sprites, 0, 0, 10, 10) for i in range(5)]
+        sprites.remove_from_list(sprs[2])
+        sprites.remove_from_list(sprs[2])  # already removed
+        self.assertEqual(sprites.list, sprs[:2] + sprs[3:])
+        self._check(sprites)
+
+    def test_set_layers(self):
+        ''' Sprites given the same layer go on top of it, in the order
+        given, and hidden sprites come back '''
+        sprites = Sprites(_Widget())
+        a, b, c, d = [_sprite(sprites, 0, 0, 10, 10) for i in range(4)]
+        under = _sprite(sprites, 0, 0, 10, 10, 50)
+        d.hide()
+        sprites.set_layers([(c, 100), (d, 100), (a, 100), (under, 100)])
+        self.assertEqual(sprites.list, [b, c, d, a, under])
+        sprites.set_layers([(a, 50), (b, 50)])
+        self.assertEqual(sprites.list, [a, b, c, d, under])
+        self._check(sprites)
+
+    def test_random_operations(self):
+        sprites = Sprites(_Widget())
+        sprs = [_sprite(sprites, 0, 0, 10, 10, random.randrange(4))
+                for i in range(30)]
+        for n in range(300):
+            spr = random.choice(sprs)
+            operation = random.randrange(4)
+            if operation == 0:
+                spr.set_layer(random.randrange(4))
+            elif operation == 1:
+                spr.hide()
+            elif operation == 2 and spr not in sprites.list:
+                sprites.insert_in_list(
+                    spr, random.randrange(len(sprites.list) + 1))
+            else:
+                sprites.set_layers([(other, random.randrange(4))
+                                    for other in random.sample(sprs, 3)])
+            self._check(sprites)
+
+
+@unittest.skipIf(Sprites is None, _missing)
+class LayoutCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cr = cairo.Context(
+            cairo.ImageSurface(cairo.FORMAT_ARGB32, 200, 200))
+        patcher = mock.patch.object(
+            sprites_module, '_layout_label',
+            wraps=sprites_module._layout_label)
+        self.layout = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sprites = Sprites(_Widget())
+
+    def _labelled(self, label, width=40):
+        spr = _sprite(self.sprites, 0, 0, width, 20)
+        spr.set_font('Sans')
+        spr.set_label_color('black')
+        spr.set_label(label)
+        return spr
+
+    def test_shared_between_sprites(self):
+        first = self._labelled('1')
+        second = self._labelled('1')
+        first.draw_label(self.cr)
+        second.draw_label(self.cr)
+        self.assertEqual(self.layout.call_count, 1)
+        self._labelled('2').draw_label(self.cr)
+        self._labelled('1', width=60).draw_label(self.cr)
+        self.assertEqual(self.layout.call_count, 3)
+
+    def test_least_recently_used_dropped(self):
+        def get(text):
+            self.sprites.get_layout(self.cr, text, 'Sans', 12, True, 40)
+
+        for n in range(LAYOUT_CACHE_SIZE):
+            get(str(n))
+        get('0')  # now the latest used
+        get('new')
+        self.assertEqual(len(self.sprites._layouts), LAYOUT_CACHE_SIZE)
+        calls = self.layout.call_count
+        get('0')
+        self.assertEqual(self.layout.call_count, calls)
+        get('1')
+        self.assertEqual(self.layout.call_count, calls + 1)
+
+    def test_invalidation(self):
+        spr = self._labelled('1')
+        spr.draw_label(self.cr)
+        spr.draw_label(self.cr)
+        self.assertEqual(self.layout.call_count, 1)
+        changes = [
+            lambda: spr.set_label('2'),
+            lambda: spr.set_label_attributes(16),
+            lambda: spr.set_font('Serif'),
+            lambda: spr.set_image(
+                cairo.ImageSurface(cairo.FORMAT_ARGB32, 80, 20)),
+        ]
+        for n, change in enumerate(changes):
+            change()
+            self.assertEqual(spr._layouts, {})
+            spr.draw_label(self.cr)
+            self.assertEqual(self.layout.call_count, n + 2)
+        # The same size keeps the layout
+        spr.set_image(cairo.ImageSurface(cairo.FORMAT_ARGB32, 80, 20))
+        spr.draw_label(self.cr)
+        self.assertEqual(self.layout.call_count, len(changes) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#Copyright (c) 2026 Sugar Labs
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+import json
+import unittest
+
+try:
+    from collabwrapper import JSONStreamDecoder
+except ImportError as e:  # needs PyGObject, Telepathy and sugar3
+    JSONStreamDecoder = None
+    _missing = str(e)
+else:
+    _missing = ''
+
+DOCUMENTS = [
+    {'game': [2, 3, 0, 1], 'clock': 12},
+    {'quote': 'a "b", [c] {d}', 'slash': 'e\\', 'nested': {'f': [[], {}]}},
+    {'text': 'réflexion ↔ \U0001f600', 'empty': ''},
+    [1, 'two', [3, {'four': 4}], None, True, -5.5],
+    {},
+    [],
+]
+
+
+def _decode(chunks, limit=None):
+    decoder = JSONStreamDecoder(limit)
+    for chunk in chunks:
+        decoder.feed(chunk)
+    return decoder.close()
+
+
+@unittest.skipIf(JSONStreamDecoder is None, _missing)
+class JSONStreamDecoderTest(unittest.TestCase):
+
+    def test_whole(self):
+        for document in DOCUMENTS:
+            data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+            self.assertEqual(_decode([data]), document)
+
+    def test_every_split(self):
+        ''' Chunks can end inside a string, an escape, a number or a
+        UTF-8 character '''
+        for document in DOCUMENTS:
+            data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+            for i in range(len(data) + 1):
+                self.assertEqual(_decode([data[:i], data[i:]]), document,
+                                 'split at %d of %r' % (i, data))
+
+    def test_byte_at_a_time(self):
+        for document in DOCUMENTS:
+            data = json.dumps(document, ensure_ascii=False,
+                              indent=1).encode('utf-8')
+            self.assertEqual(
+                _decode([data[i:i + 1] for i in range(len(data))]),
+                document)
+
+    def test_scalar(self):
+        self.assertEqual(_decode([b' "ab', b'c" ']), 'abc')
+        self.assertEqual(_decode([b'12', b'3']), 123)
+
+    def test_errors(self):
+        for chunks in [[b'{"a": 1'], [b'[1, 2}'], [b'{"a": 1}', b' x'],
+                       [b'[1,, 2]'], [b'{"a": 1,}']]:
+            self.assertRaises(ValueError, _decode, chunks)
+
+    def test_limit(self):
+        self.assertEqual(_decode([b'[1, ', b'2]'], limit=6), [1, 2])
+        self.assertRaises(ValueError, _decode, [b'[1, ', b'2, 3]'], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()